@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import auth,  post, chat,profile, cubes
+from app.api.api_v1.endpoints import auth,  post, chat,profile, cubes, internal
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Auth"])
@@ -7,3 +7,4 @@ api_router.include_router(post.router, prefix="/posts", tags=["Posts"])
 api_router.include_router(chat.router, prefix="/chat", tags=["Chat"])
 api_router.include_router(profile.router, prefix="/profile", tags=["Profile"])
 api_router.include_router(cubes.router, prefix="/cubes", tags=["Cubes"])
+api_router.include_router(internal.router, prefix="/internal", tags=["Internal"])
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from app.schemas.user import User, LoginRequest, UserInDB
 from app.db.database import get_db
 from app.auth.jwthandler import create_access_token
+from app.crud.user import invalidate_user, normalize_username
+from app.dependencies.auth import get_current_user
 from datetime import datetime , timedelta , timezone
 
 router = APIRouter()
@@ -30,10 +32,12 @@ async def signup(user: User):
         username=user.username,
         phone=user.phone,
         hashed_password=user.password,
-        friends=user.friends
+        friends=user.friends,
+        username_lower=normalize_username(user.username)
     )
 
     await db["users"].insert_one(user_in_db.model_dump())
+    invalidate_user(username=user.username)  # drop any cached "not found"
     new_user = await db["users"].find_one({"phone": user.phone})
     return {"message": "User created successfully",
             "user": {
@@ -54,7 +58,7 @@ async def login(user: LoginRequest):
     if user.password != existing_user["hashed_password"]:
         raise HTTPException(status_code=401, detail="Incorrect password")
 
-    token = create_access_token({"sub": user.username})
+    token = create_access_token({"sub": user.username, "ver": existing_user.get("tokenVersion", 0)})
 
     return {
         "access_token": token,
@@ -66,6 +70,16 @@ async def login(user: LoginRequest):
         }
     }
 
+@router.post("/revoke-tokens")
+async def revoke_tokens(current_user: dict = Depends(get_current_user)):
+    db = get_db()
+
+    # Other workers may accept old tokens until their user cache entry expires
+    await db["users"].update_one({"_id": current_user["_id"]}, {"$inc": {"tokenVersion": 1}})
+    invalidate_user(current_user["_id"], current_user["username"])
+
+    return {"success": True, "message": "All existing tokens revoked"}
+
 @router.post("/generate-otp")
 async def generate_otp(phone:str):
     db= get_db()
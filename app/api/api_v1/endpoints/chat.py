@@ -1,31 +1,100 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.db.database import get_db
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
+from bson.errors import InvalidId
+from uuid import uuid4
 from app.schemas.chat import ChatMessageCreate, ChatMessageResponse
+from app.chat.broker import Broker, create_broker
+from app.chat.writer import chat_writer
+from app.core.config import settings
+from app.crud.user import get_user_by_username
+from app.crud.conversation import conversation_id, record_messages, mark_read_up_to, fetch_inbox
+from app.core.cursor import encode_cursor, decode_cursor, keyset_filter
+from app.core.responses import FastJSONResponse, dumps
+from app.core.concurrency import gather_queries
 
 router = APIRouter()
 
-# In-memory connection manager for WebSocket
+# Connection manager for WebSocket. Users connected to this worker are served
+# directly; anyone else is reached through the broker on the worker that holds them.
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, broker: Broker):
+        self.worker_id = uuid4().hex
+        self.broker = broker
         self.active_connections: dict[str, WebSocket] = {}
 
+    @property
+    def channel(self) -> str:
+        return f"chat:worker:{self.worker_id}"
+
+    async def start(self):
+        await self.broker.subscribe(self.channel, self._deliver)
+
+    async def stop(self):
+        for username in list(self.active_connections):
+            await self.broker.clear_presence(username, self.worker_id)
+        await self.broker.close()
+
     async def connect(self, username: str, websocket: WebSocket):
         await websocket.accept()
         self.active_connections[username] = websocket
+        await self.broker.set_presence(username, self.worker_id)
 
-    def disconnect(self, username: str):
-        if username in self.active_connections:
+    async def disconnect(self, username: str, websocket: WebSocket):
+        # A reconnect may already have replaced this socket
+        if self.active_connections.get(username) is websocket:
             del self.active_connections[username]
+            await self.broker.clear_presence(username, self.worker_id)
 
     async def send_personal_message(self, message: dict, username: str):
-        if username in self.active_connections:
-            await self.active_connections[username].send_json(message)
-
-manager = ConnectionManager()
+        websocket = self.active_connections.get(username)
+        if websocket is not None:
+            try:
+                await websocket.send_json(message)
+            except Exception as e:
+                print(f"Dropping chat socket for {username} after a failed send: {e}")
+                await self.disconnect(username, websocket)
+            return
+
+        worker_id = await self.broker.get_presence(username)
+        if worker_id and worker_id != self.worker_id:
+            await self.broker.publish(f"chat:worker:{worker_id}", {"to": username, "message": message})
+
+    async def _deliver(self, envelope: dict):
+        websocket = self.active_connections.get(envelope["to"])
+        if websocket:
+            try:
+                await websocket.send_json(envelope["message"])
+            except Exception as e:
+                print(f"Failed to deliver routed chat event to {envelope['to']}: {e}")
+
+manager = ConnectionManager(create_broker(settings.CHAT_BROKER_URL, settings.CHAT_PRESENCE_TTL_SECONDS))
+
+async def _read_up_to(db, timestamp: Optional[str], message_id: Optional[str]) -> Optional[datetime]:
+    """A read receipt's watermark: its timestamp (clients echo the one delivered
+    with the message), else its message's. A message can still be in the write
+    buffer, so that is checked before the database.
+
+    Raises ValueError, TypeError or InvalidId for malformed input.
+    """
+    if timestamp:
+        up_to = datetime.fromisoformat(timestamp)
+        # Chat timestamps are naive UTC
+        return up_to.astimezone(timezone.utc).replace(tzinfo=None) if up_to.tzinfo else up_to
+    if not message_id:
+        raise ValueError("read_receipt needs a timestamp or message_id")
+    oid = ObjectId(message_id)
+    message = chat_writer.pending(oid) or await db["chats"].find_one({"_id": oid}, {"timestamp": 1})
+    return message["timestamp"] if message else None
+
+async def apply_read_receipt(db, reader: str, sender: str, up_to: datetime) -> int:
+    """Mark `sender`'s messages to `reader` up to `up_to` as read; returns how many were newly read."""
+    # A receipt can arrive within the commit window of the messages it covers
+    await chat_writer.flushed(conversation_id(reader, sender), sender, up_to)
+    return await mark_read_up_to(db, reader, sender, up_to)
 
 @router.websocket("/ws/chat/{username}")
 async def chat_websocket(websocket: WebSocket, username: str):
@@ -41,23 +110,36 @@ async def chat_websocket(websocket: WebSocket, username: str):
                 receiver = data["receiver"]
                 content = data["content"]
 
-                # Check if sender and receiver are friends
-                sender_user = await db["users"].find_one({"username": sender})
-                if not sender_user or receiver not in sender_user.get("friends", []):
+                # Check if sender and receiver are friends (friends lists hold user ids)
+                sender_user, receiver_user = await gather_queries(
+                    get_user_by_username(db, sender),
+                    get_user_by_username(db, receiver)
+                )
+                if not sender_user or not receiver_user or str(receiver_user["_id"]) not in sender_user.get("friends", []):
                     await websocket.send_json({"error": "Not allowed to chat. Not friends."})
                     continue
 
                 chat_doc = {
+                    "_id": ObjectId(),  # assigned here so delivery doesn't wait on the write
+                    "conversation_id": conversation_id(sender, receiver),
                     "sender_username": sender,
                     "receiver_username": receiver,
                     "message": content,
                     "timestamp": datetime.utcnow(),
                     "is_read": False
                 }
-                result = await db["chats"].insert_one(chat_doc)
-                chat_doc["id"] = str(result.inserted_id)
+                await chat_writer.submit(chat_doc)
 
-                await manager.send_personal_message({"type": "message", **chat_doc}, receiver)
+                # Events must be plain JSON to cross workers
+                await manager.send_personal_message({
+                    "type": "message",
+                    "id": str(chat_doc["_id"]),
+                    "sender_username": sender,
+                    "receiver_username": receiver,
+                    "message": content,
+                    "timestamp": chat_doc["timestamp"].isoformat(),
+                    "is_read": False
+                }, receiver)
 
             elif msg_type == "typing":
                 await manager.send_personal_message({"type": "typing", "from": username}, data["receiver"])
@@ -66,19 +148,47 @@ async def chat_websocket(websocket: WebSocket, username: str):
                 await manager.send_personal_message({"type": "stop_typing", "from": username}, data["receiver"])
 
             elif msg_type == "read_receipt":
-                message_id = data["message_id"]
-                await db["chats"].update_one({"_id": ObjectId(message_id)}, {"$set": {"is_read": True}})
-                await manager.send_personal_message({"type": "read_receipt", "message_id": message_id}, data["sender"])
+                # "Read up to": the newest message the client has seen covers everything
+                # before it in the conversation
+                message_id = data.get("message_id")
+                if not isinstance(data.get("sender"), str):
+                    await websocket.send_json({"error": "read_receipt needs the sender"})
+                    continue
+                try:
+                    up_to = await _read_up_to(db, data.get("timestamp"), message_id)
+                except (ValueError, TypeError, InvalidId):
+                    await websocket.send_json({"error": "Invalid read_receipt timestamp or message_id"})
+                    continue
+                if up_to is None:
+                    await websocket.send_json({"error": "Message not found"})
+                    continue
+
+                read_count = await apply_read_receipt(db, username, data["sender"], up_to)
+                if read_count:
+                    await manager.send_personal_message({
+                        "type": "read_receipt",
+                        "message_id": message_id,
+                        "from": username,
+                        "up_to": up_to.isoformat(),
+                        "count": read_count
+                    }, data["sender"])
 
     except WebSocketDisconnect:
-        manager.disconnect(username)
+        pass
+    except Exception as e:
+        print(f"Chat socket for {username} closed after an error: {e}")
+    finally:
+        # Always unregister, or later sends would go to a dead socket
+        await manager.disconnect(username, websocket)
 
 @router.post("/send", response_model=ChatMessageResponse)
 async def send_message(message: ChatMessageCreate):
     db = get_db()
 
-    sender = await db["users"].find_one({"username": message.sender_username})
-    receiver = await db["users"].find_one({"username": message.receiver_username})
+    sender, receiver = await gather_queries(
+        get_user_by_username(db, message.sender_username),
+        get_user_by_username(db, message.receiver_username)
+    )
 
     if not sender or not receiver:
         raise HTTPException(status_code=404, detail="User not found")
@@ -87,6 +197,7 @@ async def send_message(message: ChatMessageCreate):
         raise HTTPException(status_code=403, detail="You are not friends with this user")
 
     chat_doc = {
+        "conversation_id": conversation_id(message.sender_username, message.receiver_username),
         "sender_username": message.sender_username,
         "receiver_username": message.receiver_username,
         "message": message.message,
@@ -96,6 +207,7 @@ async def send_message(message: ChatMessageCreate):
 
     result = await db["chats"].insert_one(chat_doc)
     chat_doc["id"] = str(result.inserted_id)
+    await record_messages(db, [chat_doc])
 
     return chat_doc
 
@@ -107,8 +219,11 @@ async def get_daily_chat(
     db = get_db()
 
     # Validate both users exist
-    for username in [sender_username, receiver_username]:
-        user = await db["users"].find_one({"username": username})
+    users = await gather_queries(
+        get_user_by_username(db, sender_username),
+        get_user_by_username(db, receiver_username)
+    )
+    for username, user in zip([sender_username, receiver_username], users):
         if not user:
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
 
@@ -117,13 +232,8 @@ async def get_daily_chat(
     end = start + timedelta(days=1)
 
     query = {
-        "$and": [
-            {"$or": [
-                {"sender_username": sender_username, "receiver_username": receiver_username},
-                {"sender_username": receiver_username, "receiver_username": sender_username}
-            ]},
-            {"timestamp": {"$gte": start, "$lt": end}}
-        ]
+        "conversation_id": conversation_id(sender_username, receiver_username),
+        "timestamp": {"$gte": start, "$lt": end}
     }
 
     chats = await db["chats"].find(query).sort("timestamp", 1).to_list(length=500)
@@ -133,63 +243,80 @@ async def get_daily_chat(
 
     return chats
 
+@router.get("/history")
+async def get_chat_history(
+    sender_username: str = Query(...),
+    receiver_username: str = Query(...),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Page backwards (newest first) through a conversation between two users.
+
+    The page is streamed straight from the database cursor; `next_cursor` comes
+    last and continues into older messages.
+    """
+    db = get_db()
+
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    users = await gather_queries(
+        get_user_by_username(db, sender_username),
+        get_user_by_username(db, receiver_username)
+    )
+    for username, user in zip([sender_username, receiver_username], users):
+        if not user:
+            raise HTTPException(status_code=404, detail=f"User '{username}' not found")
+
+    query = {"conversation_id": conversation_id(sender_username, receiver_username)}
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if after:
+        query.update(keyset_filter(after, ts_field="timestamp"))
+
+    chats_cursor = db["chats"].find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+
+    async def stream():
+        yield b'{"success":true,"data":['
+        count, last = 0, None
+        async for chat in chats_cursor:
+            if count:
+                yield b","
+            yield dumps({
+                "id": chat["_id"],
+                "sender_username": chat["sender_username"],
+                "receiver_username": chat["receiver_username"],
+                "message": chat["message"],
+                "timestamp": chat["timestamp"],
+                "is_read": chat.get("is_read", False)
+            })
+            count, last = count + 1, chat
+        next_cursor = encode_cursor(last["timestamp"], last["_id"]) if count == limit else None
+        yield b'],"next_cursor":' + dumps(next_cursor) + b'}'
+
+    return StreamingResponse(stream(), media_type="application/json")
+
 @router.get("/last-messages/{username}")
 async def get_last_messages(username: str, limit: int = 20):
     db = get_db()
 
     # Validate user exists
-    current_user = await db["users"].find_one({"username": username})
+    current_user = await get_user_by_username(db, username)
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Fetch all messages where the user is sender or receiver
-    messages_cursor = db["chats"].find({
-        "$or": [
-            {"sender_username": username},
-            {"receiver_username": username}
-        ]
-    }).sort("timestamp", -1)
-
-    last_messages_map = {}
-
-    async for msg in messages_cursor:
-        # Determine the "other" user in the chat
-        other_user = msg["receiver_username"] if msg["sender_username"] == username else msg["sender_username"]
-
-        # Only keep the latest message for each conversation
-        if other_user not in last_messages_map:
-            # Fetch other user details
-            user_doc = await db["users"].find_one({"username": other_user})
-            if not user_doc:
-                continue
-
-            # Count unread messages for this conversation
-            unread_count = await db["chats"].count_documents({
-                "sender_username": other_user,
-                "receiver_username": username,
-                "is_read": False
-            })
+    inbox = await fetch_inbox(db, username, limit)
 
-            last_messages_map[other_user] = {
-                "userId": str(user_doc["_id"]),
-                "username": user_doc["username"],
-                "profilePic": user_doc.get("profilePic", ""),
-                "lastMessage": msg["message"],
-                "timestamp": msg["timestamp"],
-                "unreadCount": unread_count
-            }
-
-        if len(last_messages_map) >= limit:
-            break
-
-    # Sort by most recent timestamp
-    sorted_chats = sorted(
-        last_messages_map.values(),
-        key=lambda x: x["timestamp"],
-        reverse=True
-    )
-
-    return {
+    return FastJSONResponse({
         "success": True,
-        "data": sorted_chats
-    }
+        "data": inbox
+    })
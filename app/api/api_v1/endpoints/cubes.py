@@ -1,10 +1,18 @@
 # app/routes/cubes.py
+import re
 from fastapi import APIRouter, HTTPException, Query, Body
 from app.db.database import get_db
 from bson import ObjectId
 from datetime import datetime
 from app.schemas.cube import SendFriendRequest, RespondFriendRequest
+from app.crud.friends import transaction, claim_request, accept_claimed
+from app.crud.user import get_user_by_id, invalidate_user, normalize_username
+from app.core.config import settings
+from app.core.concurrency import gather_queries
+from app.services.friend_graph import friend_graph
+from app.services.suggestions import get_suggestions
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
@@ -12,24 +20,28 @@ router = APIRouter()
 async def get_cubes_dashboard(user_id: str):
     db = get_db()
 
-    user = await db["users"].find_one({"_id": ObjectId(user_id)})
+    user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Get incoming friend requests
-    requests_cursor = db["friend_requests"].find({"to": ObjectId(user_id)}).sort("requestedAt", -1)
+    # Get incoming friend requests, then all their senders in one query
+    requests = await db["friend_requests"].find({"to": ObjectId(user_id)}).sort("requestedAt", -1).to_list(length=None)
+    senders = {}
+    async for from_user in db["users"].find({"_id": {"$in": [r["from"] for r in requests]}}, {"username": 1}):
+        senders[from_user["_id"]] = from_user
+
+    requests = [r for r in requests if r["from"] in senders]
+    mutual_counts = friend_graph.mutual_counts(user_id, [str(r["from"]) for r in requests])
 
     cube_requests = []
-    async for request in requests_cursor:
-        from_user = await db["users"].find_one({"_id": request["from"]})
-        if from_user:
-            mutual_cubes = len(set(from_user.get("friends", [])) & set(user.get("friends", [])))
-            cube_requests.append({
-                "_id": str(from_user["_id"]),
-                "username": from_user["username"],
-                "mutualCubes": mutual_cubes,
-                "requestedAt": request["requestedAt"]
-            })
+    for request, mutual_cubes in zip(requests, mutual_counts):
+        from_user = senders[request["from"]]
+        cube_requests.append({
+            "_id": str(from_user["_id"]),
+            "username": from_user["username"],
+            "mutualCubes": mutual_cubes,
+            "requestedAt": request["requestedAt"]
+        })
 
     total_cubes = len(user.get("friends", []))
 
@@ -40,45 +52,91 @@ async def get_cubes_dashboard(user_id: str):
 
 
 @router.get("/search")
-async def search_cubes(query: str = Query(...), user_id: str = Query(...)):
+async def search_cubes(
+    query: str = Query(...),
+    user_id: str = Query(...),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=50)
+):
     db = get_db()
-    user = await db["users"].find_one({"_id": ObjectId(user_id)})
+    user = await get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    search_cursor = db["users"].find({"username": {"$regex": query, "$options": "i"}})
-    results = []
-    async for other_user in search_cursor:
-        if str(other_user["_id"]) == user_id:
-            continue
-        mutual = len(set(other_user.get("friends", [])) & set(user.get("friends", [])))
-        results.append({
+    # Anchored, escaped prefix regex on the normalized username index (bounded
+    # like a range scan); at most CUBE_SEARCH_CANDIDATES matches are ranked by
+    # mutual cubes
+    prefix = normalize_username(query.strip())
+    if not prefix:
+        return {"results": []}
+    search_cursor = db["users"].find(
+        {"username_lower": {"$regex": "^" + re.escape(prefix)}},
+        {"username": 1}
+    ).sort("username_lower", 1).limit(settings.CUBE_SEARCH_CANDIDATES)
+
+    candidates = [other_user async for other_user in search_cursor if str(other_user["_id"]) != user_id]
+    mutual_counts = friend_graph.mutual_counts(user_id, [str(other_user["_id"]) for other_user in candidates])
+    results = [
+        {
             "_Id": str(other_user["_id"]),
             "username": other_user["username"],
             "mutualCubes": mutual
-        })
+        }
+        for other_user, mutual in zip(candidates, mutual_counts)
+    ]
+
+    results.sort(key=lambda r: (-r["mutualCubes"], len(r["username"]), r["username"]))
+    return {"results": results[skip:skip + limit]}
+
+
+@router.get("/suggestions/{user_id}")
+async def get_cube_suggestions(user_id: str, limit: int = Query(20, ge=1, le=50)):
+    db = get_db()
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    return {"results": results}
+    # Drop anyone who became a friend since the suggestions were computed
+    friends = set(user.get("friends", []))
+    suggestions = [s for s in await get_suggestions(db, user_id) if s["_id"] not in friends]
+
+    return {"suggestions": suggestions[:limit]}
 
 
 @router.post("/request")
 async def send_friend_request(payload: SendFriendRequest):
     db = get_db()
 
-    from_user = await db["users"].find_one({"_id": ObjectId(payload.from_user_id)})
-    to_user = await db["users"].find_one({"_id": ObjectId(payload.to_user_id)})
+    from_user, to_user = await gather_queries(
+        get_user_by_id(db, payload.from_user_id),
+        get_user_by_id(db, payload.to_user_id)
+    )
     if not from_user or not to_user:
         raise HTTPException(status_code=404, detail="One or both users not found")
 
-    existing = await db["friend_requests"].find_one({"from": ObjectId(payload.from_user_id), "to": ObjectId(payload.to_user_id)})
-    if existing:
+    from_id, to_id = ObjectId(payload.from_user_id), ObjectId(payload.to_user_id)
+
+    # Asking someone who has already asked you accepts their request
+    async with transaction() as session:
+        reverse = await claim_request(db, to_id, from_id, session)
+        if reverse:
+            await accept_claimed(db, reverse, session)
+    if reverse:
+        _friendship_added(payload.to_user_id, payload.from_user_id)
+        return {"message": "Friend request accepted"}
+
+    # The unique (from, to) index makes this insert-if-absent in one round trip
+    try:
+        result = await db["friend_requests"].update_one(
+            {"from": from_id, "to": to_id},
+            {"$setOnInsert": {"requestedAt": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        result = None
+    if not result or result.upserted_id is None:
         raise HTTPException(status_code=400, detail="Request already sent")
 
-    await db["friend_requests"].insert_one({
-        "from": ObjectId(payload.from_user_id),
-        "to": ObjectId(payload.to_user_id),
-        "requestedAt": datetime.utcnow()
-    })
     return {"message": "Request sent successfully"}
 
 
@@ -97,20 +155,23 @@ async def cancel_friend_request(payload: SendFriendRequest):
 @router.post("/respond")
 async def respond_to_request(payload: RespondFriendRequest):
     db = get_db()
-    request = await db["friend_requests"].find_one({
-        "from": ObjectId(payload.from_user_id),
-        "to": ObjectId(payload.to_user_id)
-    })
-    if not request:
-        raise HTTPException(status_code=404, detail="Request not found")
-    print(payload.accepted,type(payload.accepted))
-    if payload.accepted:
-        await db["users"].update_one({"_id": ObjectId(payload.from_user_id)}, {"$addToSet": {"friends": str(payload.to_user_id)}})
-        await db["users"].update_one({"_id": ObjectId(payload.to_user_id)}, {"$addToSet": {"friends": str(payload.from_user_id)}})
+    from_id, to_id = ObjectId(payload.from_user_id), ObjectId(payload.to_user_id)
 
-    await db["friend_requests"].delete_one({
-        "from": ObjectId(payload.from_user_id),
-        "to": ObjectId(payload.to_user_id)
-    })
+    # Claiming the request first means a double accept finds nothing the second time
+    async with transaction() as session:
+        request = await claim_request(db, from_id, to_id, session)
+        if not request:
+            raise HTTPException(status_code=404, detail="Request not found")
+        if payload.accepted:
+            await accept_claimed(db, request, session)
+
+    if payload.accepted:
+        _friendship_added(payload.from_user_id, payload.to_user_id)
 
     return {"message": "Friend request handled"}
+
+
+def _friendship_added(a: str, b: str):
+    invalidate_user(a)
+    invalidate_user(b)
+    friend_graph.add_friendship(a, b)
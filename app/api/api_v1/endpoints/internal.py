@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.crud.user import user_cache
+from app.crud.feed_cache import feed_cache
+from app.db.database import ping_db
+from app.db.monitoring import pool_stats
+from app.db.slow_queries import slow_queries
+from app.core.responses import FastJSONResponse
+from app.chat.writer import chat_writer
+from app.dependencies.auth import require_internal_token
+
+# Readiness stays open for probes; everything else needs the internal token
+router = APIRouter()
+stats_router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+@router.get("/ready")
+async def readiness():
+    try:
+        await ping_db()
+    except Exception as e:
+        print(f"Readiness check failed: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"success": True}
+
+@stats_router.get("/stats/user-cache")
+async def get_user_cache_stats():
+    return {
+        "success": True,
+        "data": user_cache.stats()
+    }
+
+@stats_router.get("/stats/feed-cache")
+async def get_feed_cache_stats():
+    return {
+        "success": True,
+        "data": feed_cache.stats()
+    }
+
+@stats_router.get("/stats/chat-writer")
+async def get_chat_writer_stats():
+    return {
+        "success": True,
+        "data": chat_writer.stats()
+    }
+
+@stats_router.get("/stats/db-pool")
+async def get_db_pool_stats():
+    return {
+        "success": True,
+        "data": pool_stats.snapshot()
+    }
+
+@stats_router.get("/slow-queries")
+async def get_slow_queries(top: int = 50):
+    return FastJSONResponse({
+        "success": True,
+        "data": slow_queries.report(top)
+    })
+
+router.include_router(stats_router)
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Header, Response, status
 from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
 from app.schemas.post import PostCreate, UserInfo, CommentInfo, HammerInfo, PostFeedItem, FeedResponse, PostCreateRequest, PostCreateResponse
 from app.db.database import get_db
-from app.crud.post import insert_post, fetch_feed
+from app.dependencies.auth import get_optional_current_user
+from app.crud.post import insert_post
+from app.crud.feed_cache import feed_cache, personalize, etag_matches
+from app.crud.timeline import fan_out_post, fetch_timeline
+from app.crud.hammer import add_hammer, remove_hammer
+from app.crud.stats import increment_stats
+from app.crud.user import get_user_by_id
+from app.core.cursor import decode_cursor
+from app.core.responses import FastJSONResponse
+from app.core.concurrency import gather_queries
 from pydantic import BaseModel
 from app.schemas.post import CommentInfo, UserInfo
 
@@ -24,6 +33,7 @@ async def create_post(payload: PostCreateRequest, db=Depends(get_db)):
         "mediaUrl": str(payload.mediaUrl),
         "mediaType": payload.mediaType,
         "caption": payload.caption,
+        "hammerCount": 0,
         "createdAt": datetime.now(timezone.utc)
     }
 
@@ -32,6 +42,15 @@ async def create_post(payload: PostCreateRequest, db=Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to create post.")
 
+    await increment_stats(db, payload.userId, postCount=1)
+    feed_cache.invalidate_head()
+
+    # The post is already stored; a failed fan-out must not make the client retry it
+    try:
+        await fan_out_post(db, post)
+    except Exception as e:
+        print(f"Timeline fan-out failed for post {post['_id']}: {e}")
+
     return PostCreateResponse(
         message="Post created successfully.",
         timestamp=datetime.now(timezone.utc)
@@ -41,107 +60,86 @@ async def create_post(payload: PostCreateRequest, db=Depends(get_db)):
 async def get_today_posts(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, le=50),
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: Optional[dict] = Depends(get_optional_current_user)
 ):
+    # Cursor paging takes precedence; skip is kept for older clients
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     try:
         now = datetime.now(timezone.utc)
         start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_day = start_of_day + timedelta(days=1)
 
-        posts_cursor = db["posts"].find({
-            "createdAt": {
-                "$gte": start_of_day,
-                "$lt": end_of_day
-            }
-        }).sort("createdAt", -1).skip(skip).limit(limit)
-
-        posts = []
-        async for post in posts_cursor:
-            try:
-                u = ObjectId(post["userId"])
-            except Exception:
-                continue
-            user = await db.users.find_one({"_id": u})
-            if not user:
-                print(f"User not found for post: {post['userId']}")
-                continue
-
-            hammer_doc = await db.hammers.find_one({"postId": post["_id"]})
-            hammered_by = hammer_doc.get("hammered_by", []) if hammer_doc else []
-            hammer_count = len(hammered_by)
-            hammered_by_user = False  # Replace with JWT-based logic if needed
-
-            comment_cursor = db.comments.find({"postId": post["_id"]}).sort("createdAt", -1)
-            comments = []
-            async for comment in comment_cursor:
-                comment_user = await db.users.find_one({"_id": comment["userId"]})
-                if comment_user:
-                    comments.append({
-                        "_id": str(comment["_id"]),
-                        "text": comment["text"],
-                        "userDetails": {
-                            "_id": str(comment_user["_id"]),
-                            "username": comment_user["username"],
-                            "profilePic": comment_user.get("profilePic", "")
-                        },
-                        "createdAt": comment["createdAt"]
-                    })
-
-            posts.append({
-                "_id": str(post["_id"]),
-                "imageUrl": post["mediaUrl"],
-                "caption": post.get("caption", ""),
-                "createdAt": post["createdAt"],
-                "user": {
-                    "_id": str(user["_id"]),
-                    "username": user["username"],
-                    "profilePic": user.get("profilePic", "")
-                },
-                "hammers": {
-                    "count": hammer_count,
-                    "hammeredByCurrentUser": hammered_by_user
-                },
-                "comments": comments
-            })
-
-        return {
+        # The shared page is cached; the viewer's hammered flags are overlaid per request
+        viewer = current_user["username"] if current_user else None
+        page = await feed_cache.get_page(db, start_of_day, end_of_day, skip, limit, after)
+        posts, etag = await personalize(db, page, viewer)
+
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            feed_cache.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        return FastJSONResponse({
             "success": True,
             "message": "Global feed fetched successfully",
-            "data": posts
-        }
+            "data": posts,
+            "next_cursor": page.next_cursor
+        }, headers=headers)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/timeline/{user_id}")
+async def get_timeline(
+    user_id: str,
+    limit: int = Query(10, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: Optional[dict] = Depends(get_optional_current_user)
+):
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    viewer = current_user["username"] if current_user else None
+    posts, next_cursor = await fetch_timeline(db, user_id, limit, after, viewer)
+
+    return FastJSONResponse({
+        "success": True,
+        "message": "Timeline fetched successfully",
+        "data": posts,
+        "next_cursor": next_cursor
+    })
+
 @router.post("/hammer")
 async def handle_hammer(data: HammerRequest, db=Depends(get_db)):
-    post = await db["posts"].find_one({"_id": ObjectId(data.post_id)})
+    post = await db["posts"].find_one({"_id": ObjectId(data.post_id)}, {"userId": 1, "hammerCount": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    hammer_doc = await db["hammers"].find_one({"postId": ObjectId(data.post_id)})
-    hammered_by = hammer_doc.get("hammered_by", []) if hammer_doc else []
-
     if data.action == "add":
-        if data.username not in hammered_by:
-            hammered_by.append(data.username)
+        count = await add_hammer(db, post, data.username)
     elif data.action == "remove":
-        if data.username in hammered_by:
-            hammered_by.remove(data.username)
+        count = await remove_hammer(db, post, data.username)
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
-
-    await db["hammers"].update_one(
-        {"postId": ObjectId(data.post_id)},
-        {"$set": {"hammered_by": hammered_by,"userId": post["userId"]}},
-        upsert=True
-    )
+    feed_cache.invalidate_post(data.post_id)
 
     return {
         "message": "Hammer updated successfully",
         "hammers": {
-            "count": len(hammered_by),
-            "hammeredByCurrentUser": data.username in hammered_by
+            "count": count,
+            "hammeredByCurrentUser": data.action == "add"
         }
     }
 
@@ -153,13 +151,14 @@ class CommentRequest(BaseModel):
 
 @router.post("/comment", response_model=CommentInfo)
 async def add_comment(payload: CommentRequest, db=Depends(get_db)):
-    # Validate post exists
-    post = await db["posts"].find_one({"_id": ObjectId(payload.post_id)})
+    # Validate post and user exist
+    post, user = await gather_queries(
+        db["posts"].find_one({"_id": ObjectId(payload.post_id)}, {"_id": 1}),
+        get_user_by_id(db, payload.user_id)
+    )
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Validate user exists
-    user = await db["users"].find_one({"_id": ObjectId(payload.user_id)})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -172,6 +171,7 @@ async def add_comment(payload: CommentRequest, db=Depends(get_db)):
     }
 
     result = await db["comments"].insert_one(comment_doc)
+    feed_cache.invalidate_post(payload.post_id)
 
     return CommentInfo(
         _id=str(result.inserted_id),
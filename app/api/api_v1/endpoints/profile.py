@@ -2,9 +2,13 @@ from fastapi import APIRouter, HTTPException, Depends, Query,UploadFile, File, F
 from app.db.database import get_db
 from app.schemas.profile import ProfileResponse
 from app.schemas.user import UserInDB
+from app.crud.stats import get_stats
+from app.crud.user import get_user_by_id, invalidate_user
+from app.core.responses import FastJSONResponse
+from app.core.concurrency import gather_queries
 from bson import ObjectId
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
 from uuid import uuid4
 from fastapi.responses import JSONResponse
@@ -13,6 +17,8 @@ from bson.errors import InvalidId
 
 router = APIRouter()
 
+_CURRENT_USER_MISSING = object()
+
 @router.get("/profile/{user_id}")
 async def get_profile(user_id: str, current_user_id: Optional[str] = Query(None), db=Depends(get_db)):
     try:
@@ -20,64 +26,58 @@ async def get_profile(user_id: str, current_user_id: Optional[str] = Query(None)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-    user = await db.users.find_one({"_id": user_obj_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    from datetime import datetime, timedelta, timezone
-
-    now = datetime.now(timezone.utc)
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
-
-    posts_cursor = db.posts.find({
-        "userId": user_id,
-        "createdAt": {"$gte": start_of_day, "$lt": end_of_day}
-    })
-    posts = [
-        {"id": str(post["_id"]), "imageUrl": post.get("mediaUrl"),"time":post.get("createdAt")}
-        async for post in posts_cursor
-    ]   
-
-    # Default: no current user or same user
-    is_socialiced = None
-
-    # Only proceed if a different current_user_id is provided
+    current_user_obj_id = None
     if current_user_id and current_user_id != user_id:
         try:
             current_user_obj_id = ObjectId(current_user_id)
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid current user ID format")
 
-        current_user = await db.users.find_one({"_id": current_user_obj_id})
-        if not current_user:
-            raise HTTPException(status_code=404, detail="Current user not found")
+    now = datetime.now(timezone.utc)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + timedelta(days=1)
 
-        # Check if already friends
-        if user_id in current_user.get("friends", []):
-            is_socialiced = True
-        else:
-            # Check if a friend request exists (pending)
-            pending_request = await db.friend_requests.find_one({
+    async def fetch_posts():
+        posts_cursor = db.posts.find({
+            "userId": user_id,
+            "createdAt": {"$gte": start_of_day, "$lt": end_of_day}
+        })
+        return [
+            {"id": str(post["_id"]), "imageUrl": post.get("mediaUrl"),"time":post.get("createdAt")}
+            async for post in posts_cursor
+        ]
+
+    async def fetch_relationship():
+        # None: no current user or same user
+        if current_user_obj_id is None:
+            return None
+        # The pending-request lookup runs alongside the friends check; it only matters if they aren't friends
+        current_user, pending_request = await gather_queries(
+            get_user_by_id(db, current_user_obj_id),
+            db.friend_requests.find_one({
                 "$or": [
                     {"from": current_user_obj_id, "to": user_obj_id},
                     {"from": user_obj_id, "to": current_user_obj_id}
                 ]
             })
-
-            if pending_request:
-                is_socialiced = "pending"  # Or use a boolean flag is_pending=True
-            else:
-                is_socialiced = False
-    pipeline = [
-    {"$match": {"userId": user_id}},  # filter posts by userId
-    {"$project": {"hammer_count": {"$size": "$hammered_by"}}},  # count array size
-    {"$group": {"_id": None, "total_hammers": {"$sum": "$hammer_count"}}}  # sum counts
-    ]
-
-    result = await db["hammers"].aggregate(pipeline).to_list(length=1)
-
-    total_hammers = result[0]["total_hammers"] if result else 0
+        )
+        if not current_user:
+            return _CURRENT_USER_MISSING
+        if user_id in current_user.get("friends", []):
+            return True
+        return "pending" if pending_request else False
+
+    # None of these depend on each other
+    user, posts, is_socialiced, stats = await gather_queries(
+        get_user_by_id(db, user_obj_id),
+        fetch_posts(),
+        fetch_relationship(),
+        get_stats(db, user_obj_id)
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if is_socialiced is _CURRENT_USER_MISSING:
+        raise HTTPException(status_code=404, detail="Current user not found")
 
     profile_data = {
         "_Id": str(user["_id"]),
@@ -86,17 +86,17 @@ async def get_profile(user_id: str, current_user_id: Optional[str] = Query(None)
         "profilePic": user.get("profilePic"),
         "isSocialiced": is_socialiced,
         "stats": {
-            "socialiced": len(user.get("friends", [])),
-            "hammers": total_hammers
+            "socialiced": stats["friendCount"],
+            "hammers": stats["hammersReceived"]
         },
         "posts": posts
     }
 
-    return {
+    return FastJSONResponse({
         "success": True,
         "message": "Profile fetched successfully",
         "data": profile_data
-    }
+    })
 
 class ProfilePicUpdate(BaseModel):
     user_id: str
@@ -113,6 +113,7 @@ async def update_profile_pic(data: ProfilePicUpdate, db=Depends(get_db)):
         {"_id": user_id},
         {"$set": {"profilePic": data.profilePic}}
     )
+    invalidate_user(user_id)
 
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found or already updated")
@@ -1,3 +1,5 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 import jwt
@@ -16,3 +18,25 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
     expire = datetime.now(timezone.utc) + expires_delta
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+# Tokens whose signature has already been verified, mapped to their payload.
+# Bounded LRU; an entry is only trusted until the token's own `exp`.
+_verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+
+def decode_access_token(token: str) -> dict:
+    """Verify a token and return its payload, skipping signature checks for tokens seen before.
+
+    Raises jwt.PyJWTError for invalid or expired tokens.
+    """
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            _verified_tokens.move_to_end(token)
+            return payload
+        del _verified_tokens[token]
+
+    payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    _verified_tokens[token] = payload
+    while len(_verified_tokens) > settings.TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return payload
@@ -0,0 +1,162 @@
+"""Message brokers used to route chat events between workers.
+
+Each worker subscribes to its own channel and records which users it holds in
+a presence registry kept by the broker. To reach a user connected elsewhere,
+a worker looks up the owning worker and publishes to that worker's channel.
+
+`InMemoryBroker` keeps channels and presence in process memory. It is the
+default for a single worker and lets tests run several managers side by side.
+`RedisBroker` does the same over Redis pub/sub and needs the optional `redis`
+package.
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Broker(ABC):
+    @abstractmethod
+    async def publish(self, channel: str, message: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        ...
+
+    @abstractmethod
+    async def set_presence(self, username: str, worker_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get_presence(self, username: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def clear_presence(self, username: str, worker_id: str) -> None:
+        """Forget `username` only if `worker_id` still owns it (the user may have reconnected elsewhere)."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._presence: Dict[str, str] = {}
+
+    async def publish(self, channel: str, message: dict) -> None:
+        for handler in self._handlers.get(channel, []):
+            await handler(message)
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def set_presence(self, username: str, worker_id: str) -> None:
+        self._presence[username] = worker_id
+
+    async def get_presence(self, username: str) -> Optional[str]:
+        return self._presence.get(username)
+
+    async def clear_presence(self, username: str, worker_id: str) -> None:
+        if self._presence.get(username) == worker_id:
+            del self._presence[username]
+
+
+class RedisBroker(Broker):
+    PRESENCE_PREFIX = "chat:presence:"
+
+    # Atomic compare-and-delete, so a stale worker can't clear a newer connection
+    _CLEAR_PRESENCE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, presence_ttl: float):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._handlers: Dict[str, Handler] = {}
+        self._reader: Optional[asyncio.Task] = None
+        # Presence keys expire unless refreshed, so users of a crashed worker
+        # don't stay registered; this worker refreshes its own every ttl/3
+        self._presence_ttl = presence_ttl
+        self._owned: Dict[str, str] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self._redis.publish(channel, json.dumps(message))
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel] = handler
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(channel)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    try:
+                        await self._handlers[item["channel"]](json.loads(item["data"]))
+                    except Exception as e:
+                        print(f"Chat broker handler failed on {item['channel']}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Chat broker subscription lost, resubscribing: {e}")
+                await asyncio.sleep(1)
+                try:
+                    await self._pubsub.close()
+                    self._pubsub = self._redis.pubsub()
+                    await self._pubsub.subscribe(*self._handlers)
+                except Exception as e:
+                    print(f"Chat broker resubscribe failed: {e}")
+
+    async def _refresh_presence(self) -> None:
+        while True:
+            await asyncio.sleep(self._presence_ttl / 3)
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for username, worker_id in list(self._owned.items()):
+                        pipe.set(self.PRESENCE_PREFIX + username, worker_id, px=int(self._presence_ttl * 1000))
+                    await pipe.execute()
+            except Exception as e:
+                print(f"Chat presence refresh failed: {e}")
+
+    async def set_presence(self, username: str, worker_id: str) -> None:
+        self._owned[username] = worker_id
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._refresh_presence())
+        await self._redis.set(self.PRESENCE_PREFIX + username, worker_id, px=int(self._presence_ttl * 1000))
+
+    async def get_presence(self, username: str) -> Optional[str]:
+        return await self._redis.get(self.PRESENCE_PREFIX + username)
+
+    async def clear_presence(self, username: str, worker_id: str) -> None:
+        if self._owned.get(username) == worker_id:
+            del self._owned[username]
+        await self._redis.eval(self._CLEAR_PRESENCE, 1, self.PRESENCE_PREFIX + username, worker_id)
+
+    async def close(self) -> None:
+        for task in (self._reader, self._heartbeat):
+            if task:
+                task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+
+
+def create_broker(url: Optional[str], presence_ttl: float = 60) -> Broker:
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url, presence_ttl)
+    return InMemoryBroker()
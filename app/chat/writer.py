@@ -0,0 +1,180 @@
+"""Group-commit buffer for chat message inserts.
+
+Messages arriving within CHAT_WRITE_BATCH_WINDOW_MS of each other (or up to
+CHAT_WRITE_BATCH_MAX of them) are written with a single unordered
+`insert_many`, and their conversation summaries with a single `bulk_write`. Callers give each document its `_id` up front, so delivery never
+waits for the write. With CHAT_WRITE_WAIT_FOR_ACK the caller instead waits
+until its batch is acknowledged. The queue is bounded: when it is full,
+`submit` blocks, which pushes back on the socket producing the messages.
+
+Messages at or before their receiver's `readUpTo` watermark are stored as
+read: a receipt handled on another worker can move it while they wait here.
+Receipts handled on this worker first wait for the messages they cover to be
+written (`flushed`), so the messages are there to be marked.
+
+A failed insert is retried CHAT_WRITE_RETRIES times for the documents that
+didn't make it, and conversation summaries are recorded for every document
+that did, even when the rest of its batch failed.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.db.database import get_db
+from app.crud.conversation import read_watermarks, record_messages
+
+DUPLICATE_KEY = 11000
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class ChatWriteBuffer:
+    def __init__(self, window_ms: float, max_batch: int, queue_size: int, wait_for_ack: bool, retries: int = 3):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+        self.wait_for_ack = wait_for_ack
+        self.retries = retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Dict[ObjectId, Tuple[dict, asyncio.Future]] = {}  # submitted but not yet flushed, by _id
+        self.batches = 0
+        self.messages = 0
+        self.lost = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer."""
+        if self._worker:
+            await self._queue.join()
+            self._worker.cancel()
+            self._worker = None
+
+    async def submit(self, chat_doc: dict) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[chat_doc["_id"]] = (chat_doc, future)
+        await self._queue.put((chat_doc, future))
+        if self.wait_for_ack:
+            await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _insert(self, docs: List[dict]) -> Tuple[List[dict], List[dict], Optional[Exception]]:
+        """Insert `docs`, retrying what failed; returns (stored, lost, last error).
+
+        Documents carry their own `_id`, so a retry after a partial or
+        unacknowledged write is safe: already-stored ones come back as
+        duplicate key errors and count as stored.
+        """
+        stored, pending, error = [], docs, None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            try:
+                await get_db()["chats"].insert_many(pending, ordered=False)
+                return stored + pending, [], None
+            except BulkWriteError as e:
+                failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+                stored += [doc for i, doc in enumerate(pending) if i not in failed]
+                pending = [doc for i, doc in enumerate(pending) if i in failed]
+                error = e
+                if not pending:
+                    return stored, [], None
+            except Exception as e:
+                error = e
+        return stored, pending, error
+
+    async def _mark_already_read(self, docs: List[dict]):
+        try:
+            watermarks = await read_watermarks(get_db(), {(doc["receiver_username"], doc["sender_username"]) for doc in docs})
+        except Exception as e:
+            print(f"Reading read watermarks for {len(docs)} chat messages failed: {e}")
+            return
+        for doc in docs:
+            up_to = watermarks.get((doc["receiver_username"], doc["sender_username"]))
+            if up_to is not None and doc["timestamp"] <= up_to:
+                doc["is_read"] = True
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        docs = [doc for doc, _ in batch]
+        await self._mark_already_read(docs)
+        stored, lost, error = await self._insert(docs)
+
+        # Conversation summaries follow whatever was stored, even when part of the
+        # batch failed. Not retried: the unread $inc isn't idempotent, and
+        # rebuild_conversations repairs a summary that missed an update.
+        if stored:
+            try:
+                await record_messages(get_db(), stored)
+            except Exception as e:
+                print(f"Conversation update for {len(stored)} chat messages failed: {e}")
+
+        if lost:
+            self.lost += len(lost)
+            print(f"Chat batch insert lost {len(lost)} of {len(batch)} messages after {self.retries} retries: {error}")
+        lost_ids = {doc["_id"] for doc in lost}
+        for doc, _ in batch:
+            self._pending.pop(doc["_id"], None)
+        self.batches += 1
+        self.messages += len(stored)
+        for doc, future in batch:
+            if future.done():
+                continue
+            if doc["_id"] in lost_ids:
+                future.set_exception(error)
+                future.exception()  # retrieved here, so unawaited futures don't warn
+            else:
+                future.set_result(None)
+
+    def pending(self, message_id: ObjectId) -> Optional[dict]:
+        """A message that was submitted but may not be stored yet."""
+        entry = self._pending.get(message_id)
+        return entry[0] if entry else None
+
+    async def flushed(self, conversation_id: str, sender: str, up_to: datetime) -> None:
+        """Wait until `sender`'s buffered messages in the conversation, up to `up_to`, are written (or lost)."""
+        futures = [
+            future for doc, future in self._pending.values()
+            if doc["conversation_id"] == conversation_id and doc["sender_username"] == sender and doc["timestamp"] <= up_to
+        ]
+        if futures:
+            await asyncio.wait(futures)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "messages": self.messages,
+            "lost": self.lost,
+            "avgBatchSize": self.messages / self.batches if self.batches else 0.0,
+        }
+
+
+chat_writer = ChatWriteBuffer(
+    window_ms=settings.CHAT_WRITE_BATCH_WINDOW_MS,
+    max_batch=settings.CHAT_WRITE_BATCH_MAX,
+    queue_size=settings.CHAT_WRITE_QUEUE_SIZE,
+    wait_for_ack=settings.CHAT_WRITE_WAIT_FOR_ACK,
+    retries=settings.CHAT_WRITE_RETRIES,
+)
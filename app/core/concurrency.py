@@ -0,0 +1,18 @@
+import asyncio
+from typing import Any, Awaitable, List
+
+
+async def gather_queries(*queries: Awaitable) -> List[Any]:
+    """Run independent queries concurrently and return their results in order.
+
+    If any query fails, the others are cancelled before the error propagates,
+    so a failed request doesn't leave database calls running in the background.
+    """
+    tasks = [asyncio.ensure_future(query) for query in queries]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
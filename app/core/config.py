@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,7 +6,40 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     DB_NAME: str
     JWT_ALGORITHM: str = "HS256"
+    DEBUG: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    SLOW_QUERY_BUFFER_SIZE: int = 200
+    SLOW_QUERY_MAX_SHAPES: int = 500
+    INTERNAL_API_TOKEN: Optional[str] = None  # sent as X-Internal-Token; unset = /internal endpoints are off
+    MONGO_MAX_POOL_SIZE: int = 100  # per worker process
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None  # unset = wait for a connection indefinitely
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_READ_PREFERENCE: str = "primary"
+    MONGO_WRITE_CONCERN: Optional[str] = None  # e.g. "majority" or "1"; unset = server default
+    MONGO_COMPRESSORS: Optional[str] = None  # e.g. "zstd,snappy,zlib"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
+    MONGO_USE_TRANSACTIONS: bool = False  # requires a replica set
+    TOKEN_CACHE_SIZE: int = 10000
+    TIMELINE_FANOUT_LIMIT: int = 1000  # authors with more friends are merged in at read time
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 30
+    USER_CACHE_NEGATIVE_TTL_SECONDS: float = 5
+    FEED_CACHE_SIZE: int = 1000  # cached global feed pages
+    FEED_CACHE_TTL_SECONDS: float = 5  # also bounds staleness from other workers' writes
+    CHAT_BROKER_URL: Optional[str] = None  # e.g. redis://localhost:6379/0; unset = single worker
+    CHAT_PRESENCE_TTL_SECONDS: float = 60  # a crashed worker's users expire from the broker after this
+    CHAT_WRITE_BATCH_WINDOW_MS: float = 5
+    CHAT_WRITE_BATCH_MAX: int = 100
+    CHAT_WRITE_QUEUE_SIZE: int = 10000
+    CHAT_WRITE_WAIT_FOR_ACK: bool = False  # True = deliver only after the batch is written
+    CHAT_WRITE_RETRIES: int = 3  # retries for a failed batch insert before messages are dropped
+    CUBE_SEARCH_CANDIDATES: int = 200  # prefix matches ranked per search
+    FRIEND_GRAPH_REFRESH_SECONDS: float = 300
+    SUGGESTIONS_SIZE: int = 20
+    SUGGESTIONS_BATCH_SIZE: int = 1000
+    SUGGESTIONS_ACTIVE_DAYS: int = 7
+    SUGGESTIONS_MAX_AGE_HOURS: float = 24
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,32 @@
+import base64
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Opaque keyset cursors: "<epoch millis>:<ObjectId hex>" encoded as urlsafe base64.
+# Mongo stores datetimes with millisecond precision, so nothing is lost in the round trip.
+
+def encode_cursor(timestamp: datetime, _id: ObjectId) -> str:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    millis = int(timestamp.timestamp() * 1000)
+    raw = f"{millis}:{_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, ObjectId]]:
+    """Return (timestamp, _id) for a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        millis, _id = raw.split(":", 1)
+        return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), ObjectId(_id)
+    except (ValueError, InvalidId, UnicodeDecodeError, OverflowError, OSError):  # last two: out-of-range millis
+        return None
+
+def keyset_filter(after: Tuple[datetime, ObjectId], id_field: str = "_id", ts_field: str = "createdAt") -> dict:
+    """Range predicate selecting documents sorted after (timestamp, id) in descending order."""
+    after_ts, after_id = after
+    return {"$or": [
+        {ts_field: {"$lt": after_ts}},
+        {ts_field: after_ts, id_field: {"$lt": after_id}}
+    ]}
@@ -0,0 +1,192 @@
+"""Per-route request metrics in Prometheus text format.
+
+`MetricsMiddleware` times every HTTP request and files it under its route
+template (e.g. /socialice/posts/timeline/{user_id}), together with the number
+of Mongo commands it issued and the time they took. The commands are counted
+by `command_metrics`, a PyMongo CommandListener. It finds the current request
+through a context variable, which Motor carries into the threads that run
+its operations.
+
+Work per request is a few dict lookups and integer additions, cheap enough to
+leave on in production. In DEBUG mode responses also get a Server-Timing
+header.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from pymongo import monitoring
+
+from app.core.config import settings
+
+_PATH_PARAM = re.compile(r"{(\w+)(?::\w+)?}")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_COMMAND_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    __slots__ = ("scope", "db_commands", "db_seconds", "_lock")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_commands = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def route(self) -> str:
+        # The router records the matched route in the shared scope. Depending on
+        # the FastAPI version its path can be relative to an included router, so
+        # the mount prefixes are recovered from the request path: filling the
+        # template with the path params gives the tail of the request path.
+        route = self.scope.get("route")
+        if route is None:
+            return "unmatched"
+        params = self.scope.get("path_params", {})
+        try:
+            tail = _PATH_PARAM.sub(lambda m: str(params[m.group(1)]), route.path)
+        except KeyError:
+            return route.path
+        path = self.scope["path"]
+        return path[:len(path) - len(tail)] + route.path if path.endswith(tail) else route.path
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.db_commands += 1
+            self.db_seconds += seconds
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        stats = current_request.get()
+        if stats is not None:
+            stats.record(event.duration_micros / 1_000_000)
+
+
+command_metrics = CommandMetrics()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str, int], Histogram] = {}
+        self.db_commands: Dict[Tuple[str, str], Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        latency = self.latency.get(key + (status,))
+        if latency is None:
+            latency = self.latency[key + (status,)] = Histogram(LATENCY_BUCKETS)
+        latency.observe(seconds)
+
+        commands = self.db_commands.get(key)
+        if commands is None:
+            commands = self.db_commands[key] = Histogram(DB_COMMAND_BUCKETS)
+        commands.observe(stats.db_commands)
+        self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds HTTP request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            lines += _histogram_lines("http_request_duration_seconds", labels, histogram)
+
+        lines += [
+            "# HELP http_request_db_commands Mongo commands issued per HTTP request.",
+            "# TYPE http_request_db_commands histogram",
+        ]
+        for (method, route), histogram in sorted(self.db_commands.items()):
+            lines += _histogram_lines("http_request_db_commands", f'method="{method}",route="{route}"', histogram)
+
+        lines += [
+            "# HELP http_request_db_seconds_total Time spent in Mongo commands by route template.",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(self.db_seconds.items()):
+            lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}'
+    yield f"{name}_sum{{{labels}}} {histogram.sum}"
+    yield f"{name}_count{{{labels}}} {histogram.count}"
+
+
+route_metrics = RouteMetrics()
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware, so it adds no extra task or body buffering per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.DEBUG:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    timing = f"app;dur={elapsed:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc=\"{stats.db_commands} commands\""
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            route_metrics.observe(
+                scope["method"],
+                stats.route,
+                status,
+                time.perf_counter() - started,
+                stats
+            )
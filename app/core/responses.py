@@ -0,0 +1,20 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# orjson-backed responses for large list endpoints. Handlers build plain dicts
+# straight from BSON documents and return FastJSONResponse(...) themselves,
+# which skips FastAPI's jsonable_encoder pass. Datetimes come out exactly as
+# jsonable_encoder writes them (isoformat), and ObjectIds as their hex string.
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
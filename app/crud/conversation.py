@@ -0,0 +1,129 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+# One `conversations` document per (user, peer) side of a chat, holding the
+# latest message and how many messages from `peer` the `user` hasn't read yet.
+# The inbox is then a single read on (user, timestamp).
+#
+# Every chat message also carries a `conversation_id`, the same for both
+# directions of a chat, so a conversation's history is one (conversation_id,
+# timestamp) index range. Usernames may contain any character, so the first
+# username is length-prefixed; a plain separator would let ("a:b", "c") and
+# ("a", "b:c") share an id and read each other's history.
+#
+# A side's `readUpTo` watermark is authoritative for what its user has read:
+# messages at or before it are stored as read and never counted as unread,
+# even when they are written after the receipt that moved it.
+
+def conversation_id(user: str, peer: str) -> str:
+    first, second = sorted((user, peer))
+    return f"{len(first)}:{first}:{second}"
+
+def _keep_latest(field: str, value, timestamp: datetime) -> dict:
+    """Pipeline expression: `value` if `timestamp` is at least the stored one, else the stored field."""
+    return {"$cond": [
+        {"$gte": [timestamp, {"$ifNull": ["$timestamp", datetime.min]}]},
+        {"$literal": value},
+        f"${field}"
+    ]}
+
+def conversation_updates(chat_doc: dict) -> List[UpdateOne]:
+    """Updates applying one chat message to both sides of its conversation.
+
+    Built as pipeline updates so an out-of-order message never replaces a newer
+    last message, and so they can be bulk-written together with other messages.
+    """
+    sender, receiver = chat_doc["sender_username"], chat_doc["receiver_username"]
+    timestamp = chat_doc["timestamp"]
+    last = {
+        "lastMessage": _keep_latest("lastMessage", chat_doc["message"], timestamp),
+        "lastSender": _keep_latest("lastSender", sender, timestamp),
+        "timestamp": {"$max": [timestamp, {"$ifNull": ["$timestamp", datetime.min]}]},
+    }
+    return [
+        UpdateOne(
+            {"user": sender, "peer": receiver},
+            [{"$set": {**last, "unreadCount": {"$ifNull": ["$unreadCount", 0]}}}],
+            upsert=True
+        ),
+        UpdateOne(
+            {"user": receiver, "peer": sender},
+            [{"$set": {**last, "unreadCount": {"$add": [
+                {"$ifNull": ["$unreadCount", 0]},
+                {"$cond": [{"$gt": [timestamp, {"$ifNull": ["$readUpTo", datetime.min]}]}, 1, 0]}
+            ]}}}],
+            upsert=True
+        ),
+    ]
+
+async def record_messages(db: AsyncIOMotorDatabase, chat_docs: List[dict]) -> None:
+    ops = [op for chat_doc in chat_docs for op in conversation_updates(chat_doc)]
+    if ops:
+        await db.conversations.bulk_write(ops, ordered=False)
+
+async def read_watermarks(db: AsyncIOMotorDatabase, sides: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], datetime]:
+    """The `readUpTo` of each (user, peer) side that has one."""
+    sides = list(sides)
+    if not sides:
+        return {}
+    cursor = db.conversations.find(
+        {"$or": [{"user": user, "peer": peer} for user, peer in sides], "readUpTo": {"$exists": True}},
+        {"user": 1, "peer": 1, "readUpTo": 1}
+    )
+    return {(c["user"], c["peer"]): c["readUpTo"] async for c in cursor}
+
+async def mark_read_up_to(db: AsyncIOMotorDatabase, user: str, peer: str, up_to: datetime) -> int:
+    """Mark every message from `peer` to `user` sent at or before `up_to` as read.
+
+    Moves the conversation's `readUpTo` watermark forward and takes the newly
+    read messages off the unread counter. Returns how many messages that was.
+    The side is created if needed, so a receipt for a conversation's first,
+    still buffered message keeps its watermark.
+    """
+    result = await db.chats.update_many(
+        {
+            "conversation_id": conversation_id(user, peer),
+            "sender_username": peer,
+            "timestamp": {"$lte": up_to},
+            "is_read": False
+        },
+        {"$set": {"is_read": True}}
+    )
+    await db.conversations.update_one(
+        {"user": user, "peer": peer},
+        [{"$set": {
+            "readUpTo": {"$max": [up_to, {"$ifNull": ["$readUpTo", datetime.min]}]},
+            "unreadCount": {"$max": [0, {"$subtract": [{"$ifNull": ["$unreadCount", 0]}, result.modified_count]}]}
+        }}],
+        upsert=True
+    )
+    return result.modified_count
+
+async def fetch_inbox(db: AsyncIOMotorDatabase, username: str, limit: int) -> List[dict]:
+    conversations = await db.conversations.find({"user": username}).sort(
+        "timestamp", -1
+    ).limit(limit).to_list(length=limit)
+
+    peers = {}
+    async for user in db.users.find(
+        {"username": {"$in": [c["peer"] for c in conversations]}},
+        {"username": 1, "profilePic": 1}
+    ):
+        peers[user["username"]] = user
+
+    inbox = []
+    for conversation in conversations:
+        peer = peers.get(conversation["peer"])
+        if not peer or "lastMessage" not in conversation:  # only a watermark so far
+            continue
+        inbox.append({
+            "userId": str(peer["_id"]),
+            "username": peer["username"],
+            "profilePic": peer.get("profilePic", ""),
+            "lastMessage": conversation["lastMessage"],
+            "timestamp": conversation["timestamp"],
+            "unreadCount": conversation["unreadCount"]
+        })
+    return inbox
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.responses import dumps
+from app.crud.post import fetch_feed, hammered_by
+
+# Process-local cache of global feed pages, keyed by (day, skip, limit, cursor).
+#
+# - Only the viewer-independent page is cached: every item has
+#   hammeredByCurrentUser=False, and `personalize` overlays the viewer's
+#   hammers (one indexed query) on a copy.
+# - A new post only changes pages read from the top of the feed, so
+#   `invalidate_head` drops just those; a hammer or comment drops the pages
+#   that contain its post. Invalidation is local to this worker: writes made
+#   on other workers, and profile changes, show up once the page's TTL runs
+#   out, which bounds how stale a page can be.
+# - Concurrent misses for the same page share a single fetch. A fetch that
+#   overlaps an invalidation is returned to its callers but not cached.
+#
+# Cached pages are shared between callers and must be treated as read-only.
+
+PageKey = Tuple[datetime, int, int, Optional[Tuple[datetime, ObjectId]]]
+
+
+class FeedPage:
+    __slots__ = ("items", "next_cursor", "etag", "created_at")
+
+    def __init__(self, items: List[dict], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.etag = hashlib.blake2b(dumps([items, next_cursor]), digest_size=12).hexdigest()
+        self.created_at = time.monotonic()
+
+
+class FeedCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[PageKey, FeedPage]" = OrderedDict()
+        self._by_post: Dict[str, set] = {}
+        self._inflight: dict = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.not_modified = 0
+        self._served_age = 0.0
+        self._max_served_age = 0.0
+
+    def _remove(self, key: PageKey):
+        page = self._entries.pop(key, None)
+        if page is None:
+            return
+        for item in page.items:
+            keys = self._by_post.get(item["_id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_post[item["_id"]]
+
+    def _put(self, key: PageKey, page: FeedPage):
+        self._remove(key)
+        self._entries[key] = page
+        for item in page.items:
+            self._by_post.setdefault(item["_id"], set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _get(self, key: PageKey) -> Optional[FeedPage]:
+        page = self._entries.get(key)
+        if page is None:
+            return None
+        age = time.monotonic() - page.created_at
+        if age > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self._served_age += age
+        self._max_served_age = max(self._max_served_age, age)
+        return page
+
+    async def _load(self, db: AsyncIOMotorDatabase, key: PageKey, end: datetime, generation: int) -> FeedPage:
+        start, skip, limit, after = key
+        items, next_cursor = await fetch_feed(db, start, end, skip, limit, after)
+        page = FeedPage(items, next_cursor)
+        if generation == self._generation:
+            self._put(key, page)
+        return page
+
+    async def get_page(
+        self,
+        db: AsyncIOMotorDatabase,
+        start: datetime,
+        end: datetime,
+        skip: int,
+        limit: int,
+        after: Optional[Tuple[datetime, ObjectId]] = None
+    ) -> FeedPage:
+        key = (start, 0 if after else skip, limit, after)
+        page = self._get(key)
+        if page is not None:
+            self.hits += 1
+            return page
+
+        self.misses += 1
+        # Callers arriving after an invalidation don't join a fetch that started before it
+        inflight_key = (key, self._generation)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(db, key, end, self._generation))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        # Shielded so one caller being cancelled doesn't fail the others
+        return await asyncio.shield(task)
+
+    def invalidate_head(self):
+        """Drop pages read from the top of the feed, which a new post shifts."""
+        self._generation += 1
+        self.invalidations += 1
+        for key in [key for key in self._entries if key[3] is None]:
+            self._remove(key)
+
+    def invalidate_post(self, post_id: str):
+        """Drop every cached page that contains `post_id`."""
+        self._generation += 1
+        self.invalidations += 1
+        for key in list(self._by_post.get(post_id, ())):
+            self._remove(key)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._by_post.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "notModified": self.not_modified,
+            "ttlSeconds": self.ttl,
+            "avgServedAgeSeconds": self._served_age / self.hits if self.hits else 0.0,
+            "maxServedAgeSeconds": self._max_served_age,
+        }
+
+
+feed_cache = FeedCache(
+    maxsize=settings.FEED_CACHE_SIZE,
+    ttl=settings.FEED_CACHE_TTL_SECONDS,
+)
+
+
+async def personalize(db: AsyncIOMotorDatabase, page: FeedPage, viewer: Optional[str]) -> Tuple[List[dict], str]:
+    """The page's items with `viewer`'s hammered flags set, and the ETag of that response."""
+    if not viewer or not page.items:
+        return page.items, f'"{page.etag}"'
+
+    hammered = await hammered_by(db, [ObjectId(item["_id"]) for item in page.items], viewer)
+    if not hammered:
+        return page.items, f'"{page.etag}"'
+
+    hammered = {str(post_id) for post_id in hammered}
+    items = [
+        {**item, "hammers": {**item["hammers"], "hammeredByCurrentUser": True}} if item["_id"] in hammered else item
+        for item in page.items
+    ]
+    digest = hashlib.blake2b(page.etag.encode(), digest_size=12)
+    for post_id in sorted(hammered):
+        digest.update(post_id.encode())
+    return items, f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
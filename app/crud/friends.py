@@ -0,0 +1,54 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db import database
+
+# Friendship writes. Each collection is touched with at most one round trip,
+# and the steps can run in one transaction when MONGO_USE_TRANSACTIONS is set
+# (needs a replica set). Without transactions the steps run in order, and a
+# crashed accept can be repaired with the rebuild_user_stats migration.
+
+@asynccontextmanager
+async def transaction():
+    """Yield a session inside a started transaction, or None when transactions are disabled."""
+    if not settings.MONGO_USE_TRANSACTIONS:
+        yield None
+        return
+    async with await database.client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+async def claim_request(db: AsyncIOMotorDatabase, from_id: ObjectId, to_id: ObjectId, session=None) -> Optional[dict]:
+    """Remove and return a pending request. Only one concurrent caller can win it."""
+    return await db.friend_requests.find_one_and_delete({"from": from_id, "to": to_id}, session=session)
+
+async def accept_friendship(db: AsyncIOMotorDatabase, a: str, b: str, session=None) -> None:
+    result = await db.users.bulk_write([
+        UpdateOne({"_id": ObjectId(a)}, {"$addToSet": {"friends": b}}),
+        UpdateOne({"_id": ObjectId(b)}, {"$addToSet": {"friends": a}}),
+    ], ordered=False, session=session)
+
+    # Friendships are symmetric, so either both sides changed or neither did.
+    # A lone change means the data was already inconsistent; leave that to the rebuild.
+    if result.modified_count == 2:
+        await db.user_stats.bulk_write([
+            UpdateOne({"_id": ObjectId(a)}, {"$inc": {"friendCount": 1}}, upsert=True),
+            UpdateOne({"_id": ObjectId(b)}, {"$inc": {"friendCount": 1}}, upsert=True),
+        ], ordered=False, session=session)
+
+async def accept_claimed(db: AsyncIOMotorDatabase, request: dict, session=None) -> None:
+    """Accept a request won with claim_request.
+
+    Without a transaction to roll back, a failed accept puts the request back
+    so it is not lost and can be retried.
+    """
+    try:
+        await accept_friendship(db, str(request["from"]), str(request["to"]), session)
+    except Exception:
+        if session is None:
+            await db.friend_requests.insert_one(request)
+        raise
@@ -0,0 +1,52 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timezone
+
+from app.crud.stats import increment_stats
+
+# Hammers are stored as one document per (postId, username), guarded by a unique
+# index, and the post carries a denormalized `hammerCount` moved with $inc. Both
+# writes are single-document atomic operations, so concurrent hammers never lose
+# updates and no request ever reads or rewrites the full list of hammerers.
+#
+# The hammer doc and the counters are separate writes, so a failure between
+# them (or a crashed worker) leaves `hammerCount` and `hammersReceived` off by
+# one for that hammer. Re-running `migrate_hammers` and then
+# `rebuild_user_stats` recounts both from the hammer docs.
+
+async def add_hammer(db: AsyncIOMotorDatabase, post: dict, username: str) -> int:
+    """Record a hammer by `username` on `post`; returns the post's hammer count."""
+    try:
+        await db.hammers.insert_one({
+            "postId": post["_id"],
+            "username": username,
+            "userId": post["userId"],
+            "hammeredAt": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        return post.get("hammerCount", 0)
+
+    await increment_stats(db, post["userId"], hammersReceived=1)
+    updated = await db.posts.find_one_and_update(
+        {"_id": post["_id"]},
+        {"$inc": {"hammerCount": 1}},
+        projection={"hammerCount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["hammerCount"] if updated else 0
+
+async def remove_hammer(db: AsyncIOMotorDatabase, post: dict, username: str) -> int:
+    """Remove `username`'s hammer from `post`; returns the post's hammer count."""
+    result = await db.hammers.delete_one({"postId": post["_id"], "username": username})
+    if result.deleted_count == 0:
+        return post.get("hammerCount", 0)
+
+    await increment_stats(db, post["userId"], hammersReceived=-1)
+    updated = await db.posts.find_one_and_update(
+        {"_id": post["_id"]},
+        {"$inc": {"hammerCount": -1}},
+        projection={"hammerCount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["hammerCount"] if updated else 0
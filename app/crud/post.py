@@ -1,8 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 from bson import ObjectId
 
+from app.core.cursor import encode_cursor, keyset_filter
 from app.schemas.post import PostCreate, PostFeedItem, UserInfo, CommentInfo, HammerInfo
 
 async def insert_post(db: AsyncIOMotorDatabase, post: PostCreate, image_url: str = None) -> PostFeedItem:
@@ -25,45 +26,111 @@ async def insert_post(db: AsyncIOMotorDatabase, post: PostCreate, image_url: str
         comments=[]
     )
 
-async def fetch_feed(db: AsyncIOMotorDatabase, page: int, size: int) -> List[PostFeedItem]:
-    cursor = db.posts.aggregate([
-        {"$sort": {"createdAt": -1}},
-        {"$skip": (page - 1) * size},
-        {"$limit": size},
-        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "_id", "as": "user"}},
-        {"$unwind": "$user"},
-        {"$lookup": {"from": "comments", "localField": "_id", "foreignField": "post_id", "as": "comments"}},
-        {"$lookup": {"from": "hammers_meta", "localField": "_id", "foreignField": "post_id", "as": "hammersArr"}},
-        {"$addFields": {"hammers": {"$arrayElemAt": ["$hammersArr", 0]}}},
-        {"$project": {"hammersArr": 0, "user.password": 0}}
-    ])
+def _user_info(user: dict) -> dict:
+    return {
+        "_id": str(user["_id"]),
+        "username": user["username"],
+        "profilePic": user.get("profilePic", "")
+    }
+
+async def hammered_by(db: AsyncIOMotorDatabase, post_ids: List[ObjectId], viewer: str) -> set:
+    """Ids of the posts in `post_ids` that `viewer` (a username) has hammered."""
+    return {
+        hammer["postId"]
+        async for hammer in db.hammers.find({"postId": {"$in": post_ids}, "username": viewer}, {"postId": 1, "_id": 0})
+    }
+
+async def hydrate_posts(db: AsyncIOMotorDatabase, posts: List[dict], viewer: Optional[str] = None) -> List[dict]:
+    """Turn raw post documents into feed items.
+
+    Comments and every author/commenter are each fetched with a single query
+    and joined in memory; hammer counts come from the post's own `hammerCount`.
+    When `viewer` (a username) is given, the posts they hammered are found with
+    one lookup on the (postId, username) hammer index. Posts whose author is
+    missing are dropped.
+    """
+    if not posts:
+        return []
+
+    post_ids = [post["_id"] for post in posts]
+
+    hammered = await hammered_by(db, post_ids, viewer) if viewer else set()
+
+    comments_by_post = {}
+    async for comment in db.comments.find({"postId": {"$in": post_ids}}).sort("createdAt", -1):
+        comments_by_post.setdefault(comment["postId"], []).append(comment)
+
+    # Authors are stored as string ids, commenters as ObjectIds
+    user_ids = set()
+    for post in posts:
+        if ObjectId.is_valid(post["userId"]):
+            user_ids.add(ObjectId(post["userId"]))
+    for comments in comments_by_post.values():
+        user_ids.update(comment["userId"] for comment in comments)
+
+    users = {}
+    async for user in db.users.find({"_id": {"$in": list(user_ids)}}, {"username": 1, "profilePic": 1}):
+        users[user["_id"]] = user
+
     items = []
-    async for doc in cursor:
-        items.append(PostFeedItem(
-            _id=str(doc["_id"]),
-            imageUrl=doc["imageUrl"],
-            caption=doc["caption"],
-            createdAt=doc["createdAt"],
-            user=UserInfo(
-                _id=str(doc["user"]["_id"]),
-                username=doc["user"]["username"],
-                profilePic=doc["user"]["profilePic"]
-            ),
-            hammers=HammerInfo(
-                count=doc["hammers"]["count"] if doc.get("hammers") else 0,
-                hammeredByCurrentUser=doc.get("hammers", {}).get("hammeredByCurrentUser", False)
-            ),
-            comments=[
-                CommentInfo(
-                    _id=str(c["_id"]),
-                    text=c["text"],
-                    userDetails=UserInfo(
-                        _id=str(c["userDetails"]["_id"]),
-                        username=c["userDetails"]["username"],
-                        profilePic=c["userDetails"]["profilePic"]
-                    ),
-                    createdAt=c["createdAt"]
-                ) for c in doc.get("comments", [])
-            ]
-        ))
-    return items
\ No newline at end of file
+    for post in posts:
+        if not ObjectId.is_valid(post["userId"]):
+            continue
+        user = users.get(ObjectId(post["userId"]))
+        if not user:
+            continue
+
+        comments = []
+        for comment in comments_by_post.get(post["_id"], []):
+            comment_user = users.get(comment["userId"])
+            if comment_user:
+                comments.append({
+                    "_id": str(comment["_id"]),
+                    "text": comment["text"],
+                    "userDetails": _user_info(comment_user),
+                    "createdAt": comment["createdAt"]
+                })
+
+        items.append({
+            "_id": str(post["_id"]),
+            "imageUrl": post["mediaUrl"],
+            "caption": post.get("caption", ""),
+            "createdAt": post["createdAt"],
+            "user": _user_info(user),
+            "hammers": {
+                "count": post.get("hammerCount", 0),
+                "hammeredByCurrentUser": post["_id"] in hammered
+            },
+            "comments": comments
+        })
+    return items
+
+async def fetch_feed(
+    db: AsyncIOMotorDatabase,
+    start: datetime,
+    end: datetime,
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[datetime, ObjectId]] = None,
+    viewer: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Build a global feed page from a fixed number of queries, whatever the page size.
+
+    When `after` is given the page seeks past that (createdAt, _id) key instead
+    of skipping, so deep pages cost the same as the first one. Returns the items
+    and the cursor of the next page.
+    """
+    query = {"createdAt": {"$gte": start, "$lt": end}}
+    if after:
+        query.update(keyset_filter(after))
+        skip = 0
+
+    posts = await db.posts.find(query).sort(
+        [("createdAt", -1), ("_id", -1)]
+    ).skip(skip).limit(limit).to_list(length=limit)
+
+    next_cursor = None
+    if len(posts) == limit:
+        next_cursor = encode_cursor(posts[-1]["createdAt"], posts[-1]["_id"])
+
+    return await hydrate_posts(db, posts, viewer), next_cursor
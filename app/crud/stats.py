@@ -0,0 +1,22 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+# Per-user counters kept in `user_stats`, keyed by the user's ObjectId:
+#   hammersReceived  hammers on all of the user's posts
+#   friendCount      size of the user's friends list
+#   postCount        posts written by the user
+# Writers bump them with $inc; `python -m app.db.migrations rebuild_user_stats`
+# recomputes them from the source collections if they ever drift.
+
+EMPTY_STATS = {"hammersReceived": 0, "friendCount": 0, "postCount": 0}
+
+async def increment_stats(db: AsyncIOMotorDatabase, user_id, **deltas: int) -> None:
+    if isinstance(user_id, str):
+        if not ObjectId.is_valid(user_id):
+            return
+        user_id = ObjectId(user_id)
+    await db.user_stats.update_one({"_id": user_id}, {"$inc": deltas}, upsert=True)
+
+async def get_stats(db: AsyncIOMotorDatabase, user_id: ObjectId) -> dict:
+    stats = await db.user_stats.find_one({"_id": user_id}) or {}
+    return {field: stats.get(field, default) for field, default in EMPTY_STATS.items()}
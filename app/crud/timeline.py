@@ -0,0 +1,93 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.cursor import encode_cursor, keyset_filter
+from app.crud.post import hydrate_posts
+from app.crud.user import invalidate_user
+
+# Home timelines are materialized per reader in the `timelines` collection:
+# one entry per (ownerId, postId) carrying a copy of the post fields, so a
+# page is a single range read on (ownerId, createdAt, postId).
+#
+# Authors with more than TIMELINE_FANOUT_LIMIT friends are flagged `highFanout`
+# and skipped at write time; their posts are merged in when the timeline is read.
+
+_POST_FIELDS = ("userId", "mediaUrl", "mediaType", "caption", "createdAt")
+
+async def fan_out_post(db: AsyncIOMotorDatabase, post: dict) -> None:
+    """Copy a freshly written post into the timelines of its author and the author's friends."""
+    if not ObjectId.is_valid(post["userId"]):
+        return
+    author = await db.users.find_one({"_id": ObjectId(post["userId"])}, {"friends": 1, "highFanout": 1})
+    if not author:
+        return
+
+    friends = author.get("friends", [])
+    high_fanout = len(friends) > settings.TIMELINE_FANOUT_LIMIT
+    if high_fanout != author.get("highFanout", False):
+        await db.users.update_one({"_id": author["_id"]}, {"$set": {"highFanout": high_fanout}})
+        invalidate_user(author["_id"])
+
+    owners = [post["userId"]] if high_fanout else [post["userId"], *friends]
+    entry = {field: post[field] for field in _POST_FIELDS}
+    await db.timelines.insert_many(
+        [{"ownerId": owner, "postId": post["_id"], **entry} for owner in owners],
+        ordered=False
+    )
+
+async def fetch_timeline(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    limit: int,
+    after: Optional[Tuple[datetime, ObjectId]] = None,
+    viewer: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Read a page of a user's home timeline, newest first.
+
+    Returns the hydrated items and the cursor of the next page.
+    """
+    query = {"ownerId": user_id}
+    if after:
+        query.update(keyset_filter(after, id_field="postId"))
+
+    entries = await db.timelines.find(query).sort(
+        [("createdAt", -1), ("postId", -1)]
+    ).limit(limit).to_list(length=limit)
+    posts = [{"_id": entry["postId"], **{field: entry[field] for field in _POST_FIELDS}} for entry in entries]
+
+    # Fan-out-on-read for friends whose posts were not materialized
+    high_fanout_ids = [
+        str(friend["_id"])
+        async for friend in db.users.find({"highFanout": True, "friends": user_id}, {"_id": 1})
+    ]
+    if high_fanout_ids:
+        query = {"userId": {"$in": high_fanout_ids}}
+        if after:
+            query.update(keyset_filter(after))
+        merged = {post["_id"]: post for post in posts}
+        async for post in db.posts.find(query).sort([("createdAt", -1), ("_id", -1)]).limit(limit):
+            # Posts written before the author crossed the limit are already materialized
+            merged.setdefault(post["_id"], post)
+        posts = list(merged.values())
+        posts.sort(key=lambda post: (post["createdAt"], post["_id"]), reverse=True)
+        posts = posts[:limit]
+
+    if not posts:
+        return [], None
+
+    # Hammer counts move after fan-out, so they are read from the posts themselves
+    hammer_counts = {
+        post["_id"]: post.get("hammerCount", 0)
+        async for post in db.posts.find({"_id": {"$in": [post["_id"] for post in posts]}}, {"hammerCount": 1})
+    }
+    for post in posts:
+        post["hammerCount"] = hammer_counts.get(post["_id"], 0)
+
+    next_cursor = None
+    if len(posts) == limit:
+        next_cursor = encode_cursor(posts[-1]["createdAt"], posts[-1]["_id"])
+
+    return await hydrate_posts(db, posts, viewer), next_cursor
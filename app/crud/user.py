@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+
+# Process-local cache of user documents, addressable by `_id` or `username`.
+#
+# - Bounded LRU with a TTL; lookups that find nothing are cached too, for a
+#   shorter time, so repeated probes for unknown users stay off the database.
+# - Concurrent misses for the same key share a single query.
+# - Handlers that write to `users` call `invalidate_user`; other workers only
+#   converge after the TTL, which bounds how stale a cached user can be.
+#   A lookup that was already running when an invalidation happened isn't
+#   cached, since it may have read the user from before the write.
+#
+# Returned documents are shared between callers and must be treated as read-only.
+
+_MISSING = object()
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return user
+
+    def _put(self, key: tuple, user: Optional[dict], ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def _load(self, db: AsyncIOMotorDatabase, field: str, value, generation: int) -> Optional[dict]:
+        user = await db.users.find_one({field: value})
+        if generation != self._generation:
+            return user
+        if user:
+            self._put(("_id", user["_id"]), user, self.ttl)
+            self._put(("username", user["username"]), user["_id"], self.ttl)
+        else:
+            self._put((field, value), None, self.negative_ttl)
+        return user
+
+    def _lookup(self, field: str, value):
+        # Username entries only point at an id, so a user is stored (and invalidated) once
+        found = self._get((field, value))
+        if field == "username" and found is not _MISSING and found is not None:
+            found = self._get(("_id", found))
+        return found
+
+    async def get(self, db: AsyncIOMotorDatabase, field: str, value) -> Optional[dict]:
+        user = self._lookup(field, value)
+        if user is not _MISSING:
+            self.hits += 1
+            return user
+
+        self.misses += 1
+        # Callers arriving after an invalidation don't join a lookup that started before it
+        key = (field, value, self._generation)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(db, field, value, self._generation))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller being cancelled doesn't fail the others
+        return await asyncio.shield(task)
+
+    def invalidate(self, user_id: Optional[ObjectId] = None, username: Optional[str] = None):
+        self._generation += 1
+        self._entries.pop(("_id", user_id), None)
+        self._entries.pop(("username", username), None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    negative_ttl=settings.USER_CACHE_NEGATIVE_TTL_SECONDS,
+)
+
+
+async def get_user_by_id(db: AsyncIOMotorDatabase, user_id) -> Optional[dict]:
+    if isinstance(user_id, str):
+        user_id = ObjectId(user_id)
+    return await user_cache.get(db, "_id", user_id)
+
+
+async def get_user_by_username(db: AsyncIOMotorDatabase, username: str) -> Optional[dict]:
+    return await user_cache.get(db, "username", username)
+
+
+def normalize_username(username: str) -> str:
+    """The `username_lower` form cube search matches on; signup and backfills must agree on it."""
+    return username.lower()
+
+
+def invalidate_user(user_id=None, username: Optional[str] = None):
+    if isinstance(user_id, str):
+        user_id = ObjectId(user_id)
+    user_cache.invalidate(user_id=user_id, username=username)
@@ -1,13 +1,38 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.db.monitoring import pool_stats
+from app.core.metrics import command_metrics
+from app.db.slow_queries import slow_queries
 
 client: AsyncIOMotorClient = None
 db = None
 
+def _client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_stats, command_metrics, slow_queries],
+    }
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGO_WRITE_CONCERN:
+        w = settings.MONGO_WRITE_CONCERN
+        options["w"] = int(w) if w.isdigit() else w
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
+
 async def connect_db():
     global client, db
-    client = AsyncIOMotorClient(settings.MONGO_URI)
+    client = AsyncIOMotorClient(settings.MONGO_URI, **_client_options())
     db = client[settings.DB_NAME]
+    # Fail startup fast (within serverSelectionTimeoutMS) if the database can't be reached
+    await ping_db()
+
+async def ping_db():
+    await client.admin.command("ping")
 
 async def close_db():
     client.close()
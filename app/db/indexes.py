@@ -0,0 +1,89 @@
+"""Every index the API's queries rely on, applied idempotently at startup.
+
+`ensure_indexes` creates whatever is missing (create_index is a no-op for an
+index that already exists with the same spec); `index_report` lists indexes
+that are declared but missing, or present but not declared.
+"""
+from typing import List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+OTP_TTL_SECONDS = 7 * 60  # verify_otp rejects codes older than 7 minutes
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("phone", ASCENDING)], name="phone_unique", unique=True),
+        IndexModel([("username_lower", ASCENDING)], name="username_lower"),
+        # Timeline fan-out-on-read: high fan-out authors who count a reader as a friend
+        IndexModel([("friends", ASCENDING)], name="high_fanout_friends",
+                   partialFilterExpression={"highFanout": True}),
+    ],
+    "friend_requests": [
+        # Replaces the non-unique "from_to"; databases that have it need the
+        # unique_friend_requests migration
+        IndexModel([("from", ASCENDING), ("to", ASCENDING)], name="from_to_unique", unique=True),
+        IndexModel([("to", ASCENDING), ("requestedAt", DESCENDING)], name="to_requestedAt"),
+    ],
+    "chats": [
+        IndexModel([("conversation_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="conversation_timestamp_id"),
+        # Suggestion batch: who sent messages recently (covers the distinct)
+        IndexModel([("timestamp", DESCENDING), ("sender_username", ASCENDING)], name="timestamp_sender"),
+    ],
+    "comments": [
+        IndexModel([("postId", ASCENDING), ("createdAt", DESCENDING)], name="postId_createdAt"),
+    ],
+    "hammers": [
+        IndexModel([("postId", ASCENDING), ("username", ASCENDING)], name="postId_username_unique", unique=True),
+    ],
+    "posts": [
+        IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], name="createdAt_id"),
+        IndexModel([("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)], name="userId_createdAt_id"),
+    ],
+    "otp": [
+        IndexModel([("phone", ASCENDING), ("createdAt", DESCENDING)], name="phone_createdAt"),
+        IndexModel([("createdAt", ASCENDING)], name="createdAt_ttl", expireAfterSeconds=OTP_TTL_SECONDS),
+    ],
+    "conversations": [
+        IndexModel([("user", ASCENDING), ("peer", ASCENDING)], name="user_peer_unique", unique=True),
+        IndexModel([("user", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"),
+    ],
+    "timelines": [
+        IndexModel([("ownerId", ASCENDING), ("createdAt", DESCENDING), ("postId", DESCENDING)],
+                   name="ownerId_createdAt_postId"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> List[str]:
+    """Create every declared index and return the ones that could not be built.
+
+    Each index is created on its own, so one that fails (e.g. duplicates
+    blocking a unique index) is reported without holding back the rest and
+    startup still succeeds.
+    """
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                print(f"Could not create index {name} on {collection}: {e}")
+                failed.append(f"{collection}.{name}")
+    return failed
+
+
+async def index_report(db) -> dict:
+    """Return {collection: {"missing": [...], "extra": [...]}} for collections that differ."""
+    report = {}
+    for collection, indexes in INDEXES.items():
+        declared = {index.document["name"] for index in indexes}
+        existing = set(await db[collection].index_information()) - {"_id_"}
+        if declared != existing:
+            report[collection] = {
+                "missing": sorted(declared - existing),
+                "extra": sorted(existing - declared),
+            }
+    return report
@@ -0,0 +1,167 @@
+"""One-off data migrations.
+
+Run with `python -m app.db.migrations <name>`, e.g.
+`python -m app.db.migrations migrate_hammers`.
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.crud.user import normalize_username
+from app.db import database
+from app.db.indexes import INDEXES
+
+
+async def migrate_hammers(db):
+    """Split legacy per-post `hammered_by` arrays into one hammer doc per user.
+
+    Also (re)sets every post's `hammerCount` from the hammer docs, which repairs
+    any drift left between a hammer write and its counter update. Safe to re-run,
+    but run it with hammering paused since the counters are rebuilt from scratch;
+    follow it with `rebuild_user_stats` to recount `hammersReceived` too.
+    """
+    now = datetime.now(timezone.utc)
+    async for legacy in db.hammers.find({"hammered_by": {"$exists": True}}):
+        ops = [
+            InsertOne({"postId": legacy["postId"], "username": username, "userId": legacy.get("userId"), "hammeredAt": now})
+            for username in legacy.get("hammered_by", [])
+        ]
+        if ops:
+            try:
+                await db.hammers.bulk_write(ops, ordered=False)
+            except BulkWriteError:
+                pass  # duplicates of hammers already migrated
+        await db.hammers.delete_one({"_id": legacy["_id"]})
+
+    await db.posts.update_many({}, {"$set": {"hammerCount": 0}})
+    counts = db.hammers.aggregate([{"$group": {"_id": "$postId", "count": {"$sum": 1}}}])
+    ops = [UpdateOne({"_id": row["_id"]}, {"$set": {"hammerCount": row["count"]}}) async for row in counts]
+    if ops:
+        await db.posts.bulk_write(ops, ordered=False)
+
+
+async def rebuild_user_stats(db):
+    """Recompute every `user_stats` document from users and posts.
+
+    Posts store their author as a string id, users are keyed by ObjectId.
+    """
+    stats = {}
+    async for user in db.users.aggregate([{"$project": {"friendCount": {"$size": {"$ifNull": ["$friends", []]}}}}]):
+        stats[str(user["_id"])] = {"hammersReceived": 0, "friendCount": user["friendCount"], "postCount": 0}
+
+    posts = db.posts.aggregate([{"$group": {
+        "_id": "$userId",
+        "postCount": {"$sum": 1},
+        "hammersReceived": {"$sum": {"$ifNull": ["$hammerCount", 0]}}
+    }}])
+    async for row in posts:
+        if row["_id"] in stats:
+            stats[row["_id"]].update(postCount=row["postCount"], hammersReceived=row["hammersReceived"])
+
+    ops = [ReplaceOne({"_id": ObjectId(user_id)}, doc, upsert=True) for user_id, doc in stats.items()]
+    for i in range(0, len(ops), 1000):
+        await db.user_stats.bulk_write(ops[i:i + 1000], ordered=False)
+
+
+async def rebuild_conversations(db):
+    """Recompute every `conversations` document from the full chat history."""
+    sides = {}
+    directions = db.chats.aggregate([
+        {"$sort": {"timestamp": -1}},
+        {"$group": {
+            "_id": {"sender": "$sender_username", "receiver": "$receiver_username"},
+            "lastMessage": {"$first": "$message"},
+            "timestamp": {"$first": "$timestamp"},
+            "unread": {"$sum": {"$cond": [{"$eq": ["$is_read", False]}, 1, 0]}}
+        }}
+    ], allowDiskUse=True)
+    async for row in directions:
+        sender, receiver = row["_id"]["sender"], row["_id"]["receiver"]
+        for user, peer in ((sender, receiver), (receiver, sender)):
+            side = sides.setdefault((user, peer), {"user": user, "peer": peer, "unreadCount": 0, "timestamp": None})
+            if side["timestamp"] is None or row["timestamp"] > side["timestamp"]:
+                side.update(lastMessage=row["lastMessage"], lastSender=sender, timestamp=row["timestamp"])
+        sides[(receiver, sender)]["unreadCount"] += row["unread"]
+
+    ops = [ReplaceOne({"user": user, "peer": peer}, doc, upsert=True) for (user, peer), doc in sides.items()]
+    for i in range(0, len(ops), 1000):
+        await db.conversations.bulk_write(ops[i:i + 1000], ordered=False)
+
+
+async def backfill_conversation_ids(db):
+    """(Re)compute every chat message's `conversation_id`, in one server-side update.
+
+    Mirrors app.crud.conversation.conversation_id: the two usernames in sorted
+    order, the first prefixed with its length in code points. Also rewrites ids
+    in the earlier "first:second" form, which could collide. Safe to re-run.
+    """
+    sender, receiver = "$sender_username", "$receiver_username"
+    sender_first = {"$lte": [sender, receiver]}
+    first = {"$cond": [sender_first, sender, receiver]}
+    second = {"$cond": [sender_first, receiver, sender]}
+    await db.chats.update_many(
+        {},
+        [{"$set": {"conversation_id": {"$concat": [{"$toString": {"$strLenCP": first}}, ":", first, ":", second]}}}]
+    )
+
+
+async def backfill_username_lower(db):
+    """Store the normalized `username_lower` used by cube search on every user.
+
+    Normalized in Python with app.crud.user.normalize_username, as signup does;
+    the server's `$toLower` only folds ASCII. Also repairs values an earlier
+    `$toLower` backfill left behind. Safe to re-run.
+    """
+    ops = []
+    async for user in db.users.find({}, {"username": 1, "username_lower": 1}):
+        normalized = normalize_username(user["username"])
+        if user.get("username_lower") != normalized:
+            ops.append(UpdateOne({"_id": user["_id"]}, {"$set": {"username_lower": normalized}}))
+    for i in range(0, len(ops), 1000):
+        await db.users.bulk_write(ops[i:i + 1000], ordered=False)
+
+
+async def unique_friend_requests(db):
+    """Replace the old non-unique `from_to` friend request index with `from_to_unique`.
+
+    Both are on (from, to), so the unique index cannot be built while the old one
+    exists; ensure_indexes reports it as failed until this has run. Duplicate
+    requests are removed first, keeping the earliest. Safe to re-run.
+    """
+    duplicates = db.friend_requests.aggregate([
+        {"$sort": {"requestedAt": 1, "_id": 1}},
+        {"$group": {"_id": {"from": "$from", "to": "$to"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    async for row in duplicates:
+        await db.friend_requests.delete_many({"_id": {"$in": row["ids"][1:]}})
+    if "from_to" in await db.friend_requests.index_information():
+        await db.friend_requests.drop_index("from_to")
+    await db.friend_requests.create_indexes(INDEXES["friend_requests"])
+
+
+MIGRATIONS = {
+    "migrate_hammers": migrate_hammers,
+    "rebuild_user_stats": rebuild_user_stats,
+    "rebuild_conversations": rebuild_conversations,
+    "backfill_conversation_ids": backfill_conversation_ids,
+    "backfill_username_lower": backfill_username_lower,
+    "unique_friend_requests": unique_friend_requests,
+}
+
+
+async def main(name: str):
+    await database.connect_db()
+    try:
+        await MIGRATIONS[name](database.get_db())
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        sys.exit(f"usage: python -m app.db.migrations [{'|'.join(MIGRATIONS)}]")
+    asyncio.run(main(sys.argv[1]))
@@ -0,0 +1,93 @@
+"""PyMongo connection-pool monitoring.
+
+`pool_stats` is registered as an event listener on the Motor client and
+keeps running counters that the internal stats endpoint serves.
+"""
+import threading
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    # Events are delivered on PyMongo's own threads as well as the event loop's
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools_created = 0
+        self.pools_cleared = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts_started = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checked_out = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools_created += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.checkouts_started += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def _record_wait(self, event):
+        # `duration` (seconds spent waiting for a connection) exists on PyMongo >= 4.7
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.wait_time_total += duration
+            self.wait_time_max = max(self.wait_time_max, duration)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "poolsCreated": self.pools_created,
+                "poolsCleared": self.pools_cleared,
+                "connectionsCreated": self.connections_created,
+                "connectionsClosed": self.connections_closed,
+                "connectionsOpen": self.connections_created - self.connections_closed,
+                "checkedOut": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkoutsWaiting": self.checkouts_started - self.checkouts - self.checkout_failures,
+                "checkoutFailures": self.checkout_failures,
+                "avgWaitMs": 1000 * self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                "maxWaitMs": 1000 * self.wait_time_max,
+            }
+
+
+pool_stats = PoolStats()
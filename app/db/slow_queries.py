@@ -0,0 +1,171 @@
+"""Slow Mongo operation recorder.
+
+A PyMongo CommandListener times every read/write command. Commands slower
+than SLOW_QUERY_THRESHOLD_MS are reduced to their shape, with every literal
+replaced by "?". Each sample is recorded with the route that issued it. Shapes
+are aggregated by total time, and recent samples are kept in a bounded ring
+buffer. The first time a shape is seen, `explain` runs for it in the
+background, and any collection scan in the plan is flagged.
+
+All state is bounded, so the recorder can stay on in production.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.metrics import current_request
+
+_TRACKED = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+_KEEP_LITERALS = {"sort", "projection", "hint", "limit", "skip"}
+_SESSION_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference"}
+_DROP = _SESSION_FIELDS | {"documents", "cursor", "comment", "maxTimeMS", "batchSize", "readConcern", "writeConcern"}
+
+
+def command_shape(value):
+    if isinstance(value, dict):
+        return {
+            key: value[key] if key in _KEEP_LITERALS else command_shape(value[key])
+            for key in value
+            if key not in _DROP
+        }
+    if isinstance(value, (list, tuple)):
+        # Keep pipeline stages and $or branches; collapse value lists like $in to one placeholder
+        if value and all(isinstance(item, dict) for item in value):
+            return [command_shape(item) for item in value]
+        return ["?"]
+    return "?"
+
+
+def _plan_stages(explain: dict, stages: set) -> set:
+    if isinstance(explain, dict):
+        if isinstance(explain.get("stage"), str):
+            stages.add(explain["stage"])
+        for value in explain.values():
+            _plan_stages(value, stages)
+    elif isinstance(explain, list):
+        for item in explain:
+            _plan_stages(item, stages)
+    return stages
+
+
+def _winning_plan_stages(explain, stages: set) -> set:
+    """Stages of every winningPlan in an explain (an aggregate's nest under its
+    $cursor stages), leaving out rejectedPlans."""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                _plan_stages(value, stages)
+            elif key != "rejectedPlans":
+                _winning_plan_stages(value, stages)
+    elif isinstance(explain, list):
+        for item in explain:
+            _winning_plan_stages(item, stages)
+    return stages
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    # Events are delivered on PyMongo's own threads as well as the event loop's,
+    # so everything report() reads is guarded by the lock
+    def __init__(self, threshold_ms: float, buffer_size: int, max_shapes: int):
+        self._lock = threading.Lock()
+        self.threshold = threshold_ms / 1000
+        self.max_shapes = max_shapes
+        self.samples = deque(maxlen=buffer_size)
+        self.shapes = {}
+        self._pending = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._db = None
+
+    def start(self, db):
+        """Enable background explains; called from the startup hook."""
+        self._loop = asyncio.get_running_loop()
+        self._db = db
+
+    def started(self, event):
+        if event.command_name in _TRACKED:
+            self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        if command is None or event.duration_micros / 1_000_000 < self.threshold:
+            return
+
+        shape = command_shape(command)
+        shape[event.command_name] = command[event.command_name]  # the collection name isn't a literal to strip
+        key = repr(shape)
+        stats = current_request.get()
+        route = stats.route if stats is not None else "background"
+        duration_ms = event.duration_micros / 1000
+
+        with self._lock:
+            self.samples.append({
+                "shape": shape,
+                "route": route,
+                "durationMs": duration_ms,
+                "at": time.time(),
+            })
+
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                entry = self.shapes[key] = {
+                    "shape": shape,
+                    "database": event.database_name,
+                    "count": 0,
+                    "totalMs": 0.0,
+                    "maxMs": 0.0,
+                    "routes": set(),
+                    "planStages": None,
+                    "collscan": None,
+                }
+                if self._loop is not None:
+                    self._loop.call_soon_threadsafe(self._schedule_explain, key, command)
+            entry["count"] += 1
+            entry["totalMs"] += duration_ms
+            entry["maxMs"] = max(entry["maxMs"], duration_ms)
+            entry["routes"].add(route)
+
+    def _schedule_explain(self, key: str, command: dict):
+        asyncio.ensure_future(self._explain(key, command))
+
+    async def _explain(self, key: str, command: dict):
+        # `explain` itself isn't tracked, so this can't recurse
+        command = {k: v for k, v in command.items() if k not in _SESSION_FIELDS}
+        try:
+            explain = await self._db.command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            with self._lock:
+                self.shapes[key]["planStages"] = [f"explain failed: {e}"]
+            return
+        stages = _winning_plan_stages(explain, set())
+        with self._lock:
+            self.shapes[key]["planStages"] = sorted(stages)
+            self.shapes[key]["collscan"] = "COLLSCAN" in stages
+
+    def report(self, top: int = 50) -> dict:
+        with self._lock:
+            ranked = sorted(self.shapes.values(), key=lambda entry: entry["totalMs"], reverse=True)[:top]
+            return {
+                "thresholdMs": self.threshold * 1000,
+                "shapes": [{**entry, "routes": sorted(entry["routes"])} for entry in ranked],
+                "recent": list(self.samples),
+            }
+
+
+slow_queries = SlowQueryRecorder(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    buffer_size=settings.SLOW_QUERY_BUFFER_SIZE,
+    max_shapes=settings.SLOW_QUERY_MAX_SHAPES,
+)
@@ -1,7 +1,10 @@
+import secrets
 from fastapi import Header, HTTPException
-import jwt
+from typing import Optional
 from app.core.config import settings
+from app.auth.jwthandler import decode_access_token
 from app.db.database import get_db
+from app.crud.user import get_user_by_username
 
 async def get_current_user(authorization: str = Header(...)):
     try:
@@ -9,17 +12,35 @@ async def get_current_user(authorization: str = Header(...)):
         if scheme.lower() != "bearer":
             raise HTTPException(status_code=401, detail="Invalid token scheme")
 
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        email = payload.get("sub")
-        if not email:
+        payload = decode_access_token(token)
+        # create_access_token puts the username in `sub`
+        username = payload.get("sub")
+        if not username:
             raise HTTPException(status_code=401, detail="Token missing user info")
 
         db = get_db()
-        user = await db["users"].find_one({"email": email})
+        user = await get_user_by_username(db, username)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        # Bumping the user's tokenVersion revokes every token issued before it
+        if payload.get("ver", 0) != user.get("tokenVersion", 0):
+            raise HTTPException(status_code=401, detail="Token revoked")
+
         return user
 
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+async def get_optional_current_user(authorization: Optional[str] = Header(None)):
+    """Like get_current_user, but anonymous requests get None instead of a 401."""
+    if authorization is None:
+        return None
+    return await get_current_user(authorization)
+
+async def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Guards the /internal endpoints: they answer only when INTERNAL_API_TOKEN is set and sent."""
+    if not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_internal_token is None or not secrets.compare_digest(x_internal_token.encode(), settings.INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
@@ -1,9 +1,17 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
-from app.db.database import connect_db, close_db
+from app.db.database import connect_db, close_db, get_db
+from app.db.indexes import ensure_indexes, index_report
 from app.api.api_v1 import api_router
+from app.api.api_v1.endpoints.chat import manager as chat_manager
+from app.chat.writer import chat_writer
+from app.services.friend_graph import friend_graph
+from app.core.metrics import MetricsMiddleware, route_metrics
+from app.db.slow_queries import slow_queries
 
 app = FastAPI(
     title="Socialice Backend",
@@ -20,16 +28,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and Mongo command metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # DB connection on startup
 @app.on_event("startup")
 async def startup_db():
     await connect_db()
+    slow_queries.start(get_db())
+    await ensure_indexes(get_db())
+    for collection, diff in (await index_report(get_db())).items():
+        print(f"Index drift on {collection}: missing={diff['missing']} extra={diff['extra']}")
+    await chat_manager.start()
+    await chat_writer.start()
+    await friend_graph.load(get_db())
+    app.state.friend_graph_refresh = asyncio.create_task(
+        friend_graph.refresh_forever(get_db(), settings.FRIEND_GRAPH_REFRESH_SECONDS)
+    )
 
 # DB disconnection on shutdown
 @app.on_event("shutdown")
 async def shutdown_db():
+    app.state.friend_graph_refresh.cancel()
+    await chat_manager.stop()
+    await chat_writer.stop()
     await close_db()
 
 # Include all versioned routes
 app.include_router(api_router, prefix="/socialice")
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(route_metrics.render(), media_type="text/plain; version=0.0.4")
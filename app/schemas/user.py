@@ -18,3 +18,4 @@ class UserInDB(BaseModel):
     phone: int
     hashed_password: str  # Already hashed from frontend
     friends: List[str] = []
+    username_lower: str  # normalized copy for indexed prefix search
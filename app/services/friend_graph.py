@@ -0,0 +1,144 @@
+"""In-memory friend graph for mutual-cube counts.
+
+Each user id is mapped to a dense integer, and each user's friends are held
+as a sorted `array('I')` of those integers (4 bytes per edge). Mutual counts
+for a whole batch of candidates are computed at once, with numpy when it is
+installed and plain set intersection otherwise.
+
+Every worker keeps its own copy. respond_to_request updates it in place, and
+a full reload every FRIEND_GRAPH_REFRESH_SECONDS picks up friendships accepted
+on other workers. A reload builds the new graph on an executor thread (seconds
+at a million users) and swaps it in, replaying friendships added meanwhile.
+"""
+import asyncio
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+
+def _build(rows: List[Tuple[str, List[str]]]) -> Tuple[Dict[str, int], List[str], List[array]]:
+    index: Dict[str, int] = {}
+    ids: List[str] = []
+    adjacency: List[array] = []
+
+    def node(user_id: str) -> int:
+        if user_id not in index:
+            index[user_id] = len(adjacency)
+            ids.append(user_id)
+            adjacency.append(array("I"))
+        return index[user_id]
+
+    for user_id, friend_ids in rows:
+        friends = adjacency[node(user_id)]
+        friends.extend(node(friend) for friend in friend_ids)
+    for i, friends in enumerate(adjacency):
+        adjacency[i] = array("I", sorted(set(friends)))
+    return index, ids, adjacency
+
+
+class FriendGraph:
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._adjacency: List[array] = []
+        self._added_during_load: Optional[List[Tuple[str, str]]] = None
+        self.loaded = False
+
+    def _node(self, user_id: str) -> int:
+        node = self._index.get(user_id)
+        if node is None:
+            node = self._index[user_id] = len(self._adjacency)
+            self._ids.append(user_id)
+            self._adjacency.append(array("I"))
+        return node
+
+    async def load(self, db) -> None:
+        self._added_during_load = added = []
+        try:
+            rows = [(str(user["_id"]), user.get("friends", [])) async for user in db.users.find({}, {"friends": 1})]
+            built = await asyncio.get_running_loop().run_in_executor(None, _build, rows)
+        finally:
+            self._added_during_load = None
+        self._index, self._ids, self._adjacency = built
+        for a, b in added:
+            self.add_friendship(a, b)
+        self.loaded = True
+
+    async def refresh_forever(self, db, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load(db)
+            except Exception as e:
+                print(f"Friend graph refresh failed: {e}")
+
+    def add_friendship(self, a: str, b: str) -> None:
+        if self._added_during_load is not None:
+            self._added_during_load.append((a, b))  # the graph being built may predate it
+        a_node, b_node = self._node(a), self._node(b)
+        for node, friend in ((a_node, b_node), (b_node, a_node)):
+            friends = self._adjacency[node]
+            i = bisect_left(friends, friend)
+            if i == len(friends) or friends[i] != friend:
+                insort(friends, friend)
+
+    def user_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def friend_count(self, user_id: str) -> int:
+        node = self._index.get(user_id)
+        return len(self._adjacency[node]) if node is not None else 0
+
+    def mutual_counts(self, user_id: str, candidate_ids: Sequence[str]) -> List[int]:
+        """Number of friends `user_id` shares with each candidate, in candidate order."""
+        node = self._index.get(user_id)
+        if node is None or not candidate_ids:
+            return [0] * len(candidate_ids)
+        mine = self._adjacency[node]
+        theirs = [self._adjacency[self._index[c]] if c in self._index else array("I") for c in candidate_ids]
+
+        if np is not None:
+            mine_np = np.frombuffer(mine, dtype=np.uint32)
+            lengths = np.fromiter((len(friends) for friends in theirs), dtype=np.int64, count=len(theirs))
+            if not lengths.sum():
+                return [0] * len(candidate_ids)
+            flat = np.frombuffer(b"".join(friends.tobytes() for friends in theirs), dtype=np.uint32)
+            owner = np.repeat(np.arange(len(theirs)), lengths)
+            hits = np.isin(flat, mine_np)  # flat repeats ids across candidates, so not assume_unique
+            return np.bincount(owner[hits], minlength=len(theirs)).tolist()
+
+        mine_set = set(mine)
+        return [len(mine_set.intersection(friends)) for friends in theirs]
+
+    def two_hop(self, user_id: str, exclude: Iterable[str] = (), top: int = 20) -> List[Tuple[str, int]]:
+        """Friends of friends of `user_id`, ranked by how many friends they share with them.
+
+        The user, their friends and anyone in `exclude` are left out.
+        """
+        node = self._index.get(user_id)
+        if node is None:
+            return []
+        mine = self._adjacency[node]
+        skip = {node, *mine, *(self._index[e] for e in exclude if e in self._index)}
+
+        if np is not None and mine:
+            flat = np.frombuffer(b"".join(self._adjacency[f].tobytes() for f in mine), dtype=np.uint32)
+            if not len(flat):
+                return []
+            nodes, counts = np.unique(flat, return_counts=True)
+            keep = ~np.isin(nodes, np.fromiter(skip, dtype=np.uint32, count=len(skip)))
+            nodes, counts = nodes[keep], counts[keep]
+            order = np.argsort(-counts, kind="stable")[:top]
+            return [(self._ids[n], int(c)) for n, c in zip(nodes[order].tolist(), counts[order].tolist())]
+
+        counts = Counter(ff for f in mine for ff in self._adjacency[f] if ff not in skip)
+        return [(self._ids[n], c) for n, c in counts.most_common(top)]
+
+
+friend_graph = FriendGraph()
@@ -0,0 +1,110 @@
+"""Precomputed "people you may know" suggestions.
+
+Suggestions are friends of friends ranked by mutual cubes, excluding existing
+friends and anyone with a pending friend request either way. They are stored
+one document per user in `cube_suggestions`, so serving them is a point read.
+
+Run the batch job with `python -m app.services.suggestions`. It covers users
+who posted or chatted in the last SUGGESTIONS_ACTIVE_DAYS days and works in
+chunks of SUGGESTIONS_BATCH_SIZE users, so memory beyond the friend graph
+itself stays bounded. Suggestions older than SUGGESTIONS_MAX_AGE_HOURS are
+recomputed on read.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from app.core.config import settings
+from app.db import database
+from app.services.friend_graph import FriendGraph, friend_graph
+
+
+async def _pending_requests(db, user_ids: List[str]) -> dict:
+    """user id -> ids of users they have a pending request with, in either direction."""
+    object_ids = [ObjectId(user_id) for user_id in user_ids]
+    pending = {user_id: set() for user_id in user_ids}
+    async for request in db.friend_requests.find(
+        {"$or": [{"from": {"$in": object_ids}}, {"to": {"$in": object_ids}}]},
+        {"from": 1, "to": 1}
+    ):
+        sender, receiver = str(request["from"]), str(request["to"])
+        if sender in pending:
+            pending[sender].add(receiver)
+        if receiver in pending:
+            pending[receiver].add(sender)
+    return pending
+
+
+async def compute_suggestions(db, graph: FriendGraph, user_ids: List[str]) -> None:
+    """Compute and store suggestions for a chunk of users."""
+    pending = await _pending_requests(db, user_ids)
+    ranked = {user_id: graph.two_hop(user_id, pending[user_id], settings.SUGGESTIONS_SIZE) for user_id in user_ids}
+
+    suggested_ids = {ObjectId(s) for suggestions in ranked.values() for s, _ in suggestions}
+    profiles = {}
+    async for user in db.users.find({"_id": {"$in": list(suggested_ids)}}, {"username": 1, "profilePic": 1}):
+        profiles[str(user["_id"])] = user
+
+    now = datetime.now(timezone.utc)
+    ops = []
+    for user_id, suggestions in ranked.items():
+        ops.append(ReplaceOne({"_id": ObjectId(user_id)}, {
+            "suggestions": [
+                {
+                    "_id": suggested,
+                    "username": profiles[suggested]["username"],
+                    "profilePic": profiles[suggested].get("profilePic", ""),
+                    "mutualCubes": mutual
+                }
+                for suggested, mutual in suggestions if suggested in profiles
+            ],
+            "computedAt": now
+        }, upsert=True))
+    if ops:
+        await db.cube_suggestions.bulk_write(ops, ordered=False)
+
+
+async def get_suggestions(db, user_id: str) -> List[dict]:
+    doc = await db.cube_suggestions.find_one({"_id": ObjectId(user_id)})
+    max_age = timedelta(hours=settings.SUGGESTIONS_MAX_AGE_HOURS)
+    if not doc or doc["computedAt"].replace(tzinfo=timezone.utc) < datetime.now(timezone.utc) - max_age:
+        await compute_suggestions(db, friend_graph, [user_id])
+        doc = await db.cube_suggestions.find_one({"_id": ObjectId(user_id)})
+    return doc["suggestions"] if doc else []
+
+
+async def active_user_ids(db) -> List[str]:
+    since = datetime.now(timezone.utc) - timedelta(days=settings.SUGGESTIONS_ACTIVE_DAYS)
+    posters = await db.posts.distinct("userId", {"createdAt": {"$gte": since}})
+    chatters = await db.chats.distinct("sender_username", {"timestamp": {"$gte": since}})
+    active = set(posters)
+    async for user in db.users.find({"username": {"$in": chatters}}, {"_id": 1}):
+        active.add(str(user["_id"]))
+    return [user_id for user_id in active if ObjectId.is_valid(user_id)]
+
+
+async def run_batch(db, graph: FriendGraph, user_ids: List[str]) -> dict:
+    started = time.perf_counter()
+    for i in range(0, len(user_ids), settings.SUGGESTIONS_BATCH_SIZE):
+        await compute_suggestions(db, graph, user_ids[i:i + settings.SUGGESTIONS_BATCH_SIZE])
+    return {"users": len(user_ids), "seconds": round(time.perf_counter() - started, 3)}
+
+
+async def main():
+    await database.connect_db()
+    try:
+        db = database.get_db()
+        graph = FriendGraph()
+        started = time.perf_counter()
+        await graph.load(db)
+        print(f"Loaded friend graph in {time.perf_counter() - started:.1f}s")
+        print(await run_batch(db, graph, await active_user_ids(db)))
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+"""Load tests and micro-benchmarks for the Socialice backend.
+
+    python -m benchmarks load                  # seed the synthetic dataset
+    python -m benchmarks run -o results.json   # drive the app through the workload mix
+    python -m benchmarks compare base.json results.json
+    python -m benchmarks queries               # deep feed pages, profile under injected latency
+    python -m benchmarks micro                 # hot paths without a database
+
+`load`, `run` and `queries` need a MongoDB server at BENCH_MONGO_URI (default
+mongodb://localhost:27017) and always use the BENCH_DB_NAME database
+(default socialice_bench), which `load` drops and rebuilds.
+"""
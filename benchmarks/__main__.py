@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Point the app at the benchmark database before app.core.config is imported
+os.environ["MONGO_URI"] = os.environ.get("BENCH_MONGO_URI", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME", "socialice_bench")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+
+def _dataset_config(args):
+    from benchmarks.dataset import DatasetConfig
+
+    return DatasetConfig(seed=args.seed, users=args.users, posts=args.posts)
+
+
+async def _load(args):
+    from app.db import database
+    from benchmarks.dataset import load
+
+    await database.connect_db()
+    try:
+        dataset = await load(database.get_db(), _dataset_config(args))
+    finally:
+        await database.close_db()
+    print(json.dumps(dataset.summary()))
+
+
+async def _run(args):
+    from app.db import database
+    from benchmarks.dataset import Dataset
+    from benchmarks.scenarios import SCENARIOS, Workload, run
+
+    # The app connects again at startup; this client only reads the dataset back
+    await database.connect_db()
+    try:
+        data = await Dataset.from_db(database.get_db(), _dataset_config(args))
+    finally:
+        await database.close_db()
+    if not data.usernames:
+        sys.exit("benchmark database is empty; run `python -m benchmarks load` first")
+
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    workload = Workload(seed=args.seed, concurrency=args.concurrency, duration=args.duration)
+    results = await run(data, workload, scenarios)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+async def _queries(args):
+    from benchmarks.queries import run_all  # registers the latency listener before the client exists
+    from app.db import database
+    from benchmarks.dataset import Dataset
+
+    await database.connect_db()
+    try:
+        db = database.get_db()
+        data = await Dataset.from_db(db, _dataset_config(args))
+        if not data.usernames:
+            sys.exit("benchmark database is empty; run `python -m benchmarks load` first")
+        results = await run_all(db, data)
+    finally:
+        await database.close_db()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def _compare(args):
+    from benchmarks.scenarios import compare
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.tolerance)
+    if regressions:
+        sys.exit(f"regressions: {', '.join(regressions)}")
+
+
+async def _micro(args):
+    from benchmarks.micro import run_all
+
+    results = await run_all(graph_users=args.graph_users, batch_graph_users=args.batch_graph_users,
+                            batch_users=args.batch_users)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("load", "run", "queries"):
+        command = commands.add_parser(name)
+        command.add_argument("--seed", type=int, default=42)
+        command.add_argument("--users", type=int, default=5000)
+        command.add_argument("--posts", type=int, default=2000)
+    commands.choices["run"].add_argument("--concurrency", type=int, default=32)
+    commands.choices["run"].add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    commands.choices["run"].add_argument("--scenarios", help="comma-separated; default all")
+    commands.choices["run"].add_argument("-o", "--output", help="write results as JSON")
+    commands.choices["queries"].add_argument("-o", "--output", help="write results as JSON")
+
+    command = commands.add_parser("compare")
+    command.add_argument("base")
+    command.add_argument("new")
+    command.add_argument("--tolerance", type=float, default=0.10, help="allowed fractional slowdown")
+
+    command = commands.add_parser("micro")
+    command.add_argument("--graph-users", type=int, default=100000)
+    command.add_argument("--batch-graph-users", type=int, default=1000000, help="graph size for suggestions_batch")
+    command.add_argument("--batch-users", type=int, default=100000, help="active users suggestions_batch covers")
+    command.add_argument("-o", "--output", help="write results as JSON")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        _compare(args)
+    else:
+        asyncio.run({"load": _load, "run": _run, "queries": _queries, "micro": _micro}[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Seeded synthetic social graph.
+
+Friend counts follow a power law (Chung-Lu: each user gets a Pareto weight
+and edge endpoints are drawn in proportion to it), so a few users have
+thousands of cubes and most have a handful. Posts, comments and hammers lean
+towards well-connected authors the same way. The same seed and `now` always
+produce the same documents, ids included.
+
+Documents are shaped exactly like the ones the API writes, then the
+denormalized collections (user_stats, conversations) are rebuilt with the
+regular migrations and the indexes are created with ensure_indexes.
+"""
+import random
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+
+from app.crud.conversation import conversation_id
+from app.db.indexes import ensure_indexes
+from app.db.migrations import rebuild_conversations, rebuild_user_stats
+
+PASSWORD = "bench"  # every synthetic user's (already hashed) password
+CHUNK = 5000
+
+COLLECTIONS = [
+    "users", "user_stats", "posts", "comments", "hammers", "friend_requests",
+    "chats", "conversations", "timelines",
+]
+
+
+@dataclass
+class DatasetConfig:
+    seed: int = 42
+    users: int = 5000
+    avg_friends: float = 20
+    degree_exponent: float = 2.2  # Pareto tail; lower = heavier hubs
+    posts: int = 2000  # all created today, so they are in the global feed
+    comments_per_post: float = 3
+    hammers_per_post: float = 10
+    friend_requests: int = 2000
+    conversations: int = 1000
+    messages_per_conversation: int = 30
+
+
+@dataclass
+class Dataset:
+    config: DatasetConfig
+    usernames: List[str]
+    user_ids: List[str]
+    friends: Dict[str, List[str]]
+    post_ids: List[str]
+
+    def summary(self) -> dict:
+        edges = sum(len(f) for f in self.friends.values()) // 2
+        return {
+            **asdict(self.config),
+            "edges": edges,
+            "maxFriends": max((len(f) for f in self.friends.values()), default=0),
+        }
+
+    @classmethod
+    async def from_db(cls, db, config: DatasetConfig) -> "Dataset":
+        """Re-read a previously loaded dataset, so `run` doesn't have to reload it."""
+        usernames, user_ids, friends = [], [], {}
+        async for user in db.users.find({}, {"username": 1, "friends": 1}).sort("_id", 1):
+            usernames.append(user["username"])
+            user_ids.append(str(user["_id"]))
+            friends[user_ids[-1]] = user.get("friends", [])
+        post_ids = [str(post["_id"]) async for post in db.posts.find({}, {"_id": 1})]
+        return cls(config=config, usernames=usernames, user_ids=user_ids, friends=friends, post_ids=post_ids)
+
+
+def _oid(rng: random.Random, when: datetime) -> ObjectId:
+    """Deterministic ObjectId whose embedded timestamp is `when`."""
+    return ObjectId(int(when.timestamp()).to_bytes(4, "big") + rng.getrandbits(64).to_bytes(8, "big"))
+
+
+def _power_law_edges(rng: random.Random, n: int, avg_degree: float, exponent: float) -> Tuple[List[set], List[float]]:
+    """Chung-Lu graph; also returns the cumulative weights for drawing users by popularity."""
+    weights = [rng.paretovariate(exponent - 1) for _ in range(n)]
+    cap = sum(weights) ** 0.5  # the usual Chung-Lu cutoff, so no user is friends with everyone
+    weights = [min(w, cap) for w in weights]
+    cumulative, total = [], 0.0
+    for w in weights:
+        total += w
+        cumulative.append(total)
+
+    adjacency = [set() for _ in range(n)]
+    target = int(n * avg_degree / 2)
+    for _ in range(target * 2):  # bounded retries for self-loops and repeats
+        if target == 0:
+            break
+        a, b = rng.choices(range(n), cum_weights=cumulative, k=2)
+        if a != b and b not in adjacency[a]:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+            target -= 1
+    return adjacency, cumulative
+
+
+def generate(config: DatasetConfig, now: datetime = None):
+    """Build every document; returns (Dataset, {collection: [documents]})."""
+    rng = random.Random(config.seed)
+    now = now or datetime.now(timezone.utc)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_seconds = max((now - start_of_day).total_seconds(), 1)
+
+    n = config.users
+    adjacency, cumulative = _power_law_edges(rng, n, config.avg_friends, config.degree_exponent)
+
+    joined = [now - timedelta(days=rng.uniform(1, 365)) for _ in range(n)]
+    oids = [_oid(rng, joined[i]) for i in range(n)]
+    ids = [str(oid) for oid in oids]
+    usernames = [f"user{i:07d}" for i in range(n)]
+
+    users = [{
+        "_id": oids[i],
+        "fullname": f"Bench User {i}",
+        "username": usernames[i],
+        "username_lower": usernames[i],
+        "phone": 9000000000 + i,
+        "hashed_password": PASSWORD,
+        "friends": [ids[j] for j in sorted(adjacency[i])],
+        "profilePic": f"https://cdn.example.com/avatars/{i % 100}.jpg",
+    } for i in range(n)]
+
+    def weighted_user() -> int:
+        return rng.choices(range(n), cum_weights=cumulative)[0]
+
+    def how_many(mean: float) -> int:
+        return int(rng.expovariate(1 / mean)) if mean else 0
+
+    posts, comments, hammers = [], [], []
+    for _ in range(config.posts):
+        author = weighted_user()
+        created = start_of_day + timedelta(seconds=rng.uniform(0, day_seconds))
+        post_id = _oid(rng, created)
+
+        hammerers = {weighted_user() for _ in range(how_many(config.hammers_per_post))}
+        for h in hammerers:
+            hammers.append({
+                "postId": post_id,
+                "username": usernames[h],
+                "userId": ids[author],
+                "hammeredAt": created + timedelta(seconds=rng.uniform(0, 3600)),
+            })
+        posts.append({
+            "_id": post_id,
+            "userId": ids[author],
+            "mediaUrl": f"https://cdn.example.com/posts/{post_id}.jpg",
+            "mediaType": "image",
+            "caption": f"post {len(posts)}",
+            "hammerCount": len(hammerers),
+            "createdAt": created,
+        })
+
+        for _ in range(how_many(config.comments_per_post)):
+            commented = created + timedelta(seconds=rng.uniform(0, 3600))
+            comments.append({
+                "_id": _oid(rng, commented),
+                "postId": post_id,
+                "userId": oids[weighted_user()],
+                "text": "nice",
+                "createdAt": commented,
+            })
+
+    friend_requests, pairs = [], set()
+    for _ in range(config.friend_requests):
+        a, b = rng.randrange(n), rng.randrange(n)
+        if a == b or b in adjacency[a] or (a, b) in pairs or (b, a) in pairs:
+            continue
+        pairs.add((a, b))
+        friend_requests.append({
+            "from": oids[a],
+            "to": oids[b],
+            "requestedAt": now - timedelta(hours=rng.uniform(0, 240)),
+        })
+
+    chats, chatted = [], set()
+    connected = [i for i in range(n) if adjacency[i]]
+    for _ in range(config.conversations if connected else 0):
+        a = rng.choice(connected)
+        b = rng.choice(sorted(adjacency[a]))
+        if (a, b) in chatted or (b, a) in chatted:
+            continue
+        chatted.add((a, b))
+        timestamp = now - timedelta(days=rng.uniform(0, 7))
+        for m in range(config.messages_per_conversation):
+            sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+            timestamp += timedelta(seconds=rng.expovariate(1 / 120))
+            chats.append({
+                "_id": _oid(rng, timestamp),
+                "conversation_id": conversation_id(usernames[sender], usernames[receiver]),
+                "sender_username": usernames[sender],
+                "receiver_username": usernames[receiver],
+                "message": f"message {m}",
+                "timestamp": timestamp.replace(tzinfo=None),  # chats store naive UTC
+                "is_read": m < config.messages_per_conversation - 3,
+            })
+
+    dataset = Dataset(
+        config=config,
+        usernames=usernames,
+        user_ids=ids,
+        friends={ids[i]: users[i]["friends"] for i in range(n)},
+        post_ids=[str(post["_id"]) for post in posts],
+    )
+    return dataset, {
+        "users": users,
+        "posts": posts,
+        "comments": comments,
+        "hammers": hammers,
+        "friend_requests": friend_requests,
+        "chats": chats,
+    }
+
+
+async def load(db, config: DatasetConfig) -> Dataset:
+    """Drop the benchmark collections and bulk-load a fresh dataset into `db`."""
+    dataset, documents = generate(config)
+    for name in COLLECTIONS:
+        await db.drop_collection(name)
+    await ensure_indexes(db)
+
+    for name, docs in documents.items():
+        for i in range(0, len(docs), CHUNK):
+            await db[name].insert_many(docs[i:i + CHUNK], ordered=False)
+        print(f"{name}: {len(docs)}")
+
+    await rebuild_user_stats(db)
+    await rebuild_conversations(db)
+    return dataset
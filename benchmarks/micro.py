@@ -0,0 +1,290 @@
+"""Micro-benchmarks for hot paths that don't need a database.
+
+Mongo is replaced by in-memory collections that sleep for a fixed latency,
+so these isolate the app's own CPU cost and batching behaviour:
+
+- token_decode: JWT verification with and without the verified-token cache
+- feed_encode: a 50-item feed page through jsonable_encoder + json vs orjson
+- friend_graph: load, two_hop and mutual_counts on a power-law graph
+- suggestions_batch: the suggestions job (run_batch) on a 1M-user graph
+- chat_writer: messages/sec through the group-commit buffer per batch window
+- gather_queries: sequential vs concurrent lookups at a fixed per-query latency
+"""
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+from bson import ObjectId
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _timeit(fn: Callable, repeat: int) -> float:
+    """Mean seconds per call."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def token_decode(repeat: int = 2000) -> dict:
+    from app.auth import jwthandler
+
+    token = jwthandler.create_access_token({"sub": "user0000001", "ver": 0})
+    jwthandler._verified_tokens.clear()
+    uncached = _timeit(lambda: (jwthandler._verified_tokens.clear(), jwthandler.decode_access_token(token)), repeat)
+    cached = _timeit(lambda: jwthandler.decode_access_token(token), repeat)
+    return {"uncached_us": uncached * 1e6, "cached_us": cached * 1e6}
+
+
+def _feed_page(items: int = 50) -> dict:
+    now = datetime.now(timezone.utc)
+    user = {"_id": str(ObjectId()), "username": "user0000001", "profilePic": "https://cdn.example.com/avatars/1.jpg"}
+    return {
+        "success": True,
+        "message": "Global feed fetched successfully",
+        "data": [{
+            "_id": str(ObjectId()),
+            "imageUrl": "https://cdn.example.com/posts/1.jpg",
+            "caption": "post",
+            "createdAt": now,
+            "user": user,
+            "hammers": {"count": 12, "hammeredByCurrentUser": False},
+            "comments": [{"_id": str(ObjectId()), "text": "nice", "userDetails": user, "createdAt": now}] * 5,
+        } for _ in range(items)],
+        "next_cursor": None,
+    }
+
+
+def feed_encode(repeat: int = 500) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    from app.core.responses import dumps
+
+    page = _feed_page()
+    stdlib = _timeit(lambda: json.dumps(jsonable_encoder(page)).encode(), repeat)
+    fast = _timeit(lambda: dumps(page), repeat)
+    return {"jsonable_encoder_us": stdlib * 1e6, "orjson_us": fast * 1e6, "items": len(page["data"])}
+
+
+class _Cursor:
+    def __init__(self, docs, before=None):
+        self.docs = docs
+        self.before = before  # awaited before the first document, e.g. a simulated round trip
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self.before is not None:
+            await self.before
+        for doc in self.docs:
+            yield doc
+
+
+class _Users:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, *args, **kwargs):
+        return _Cursor(self.docs)
+
+
+class _GraphDb:
+    def __init__(self, docs):
+        self.users = _Users(docs)
+
+
+def _power_law_users(n: int, avg_friends: float, seed: int) -> List[dict]:
+    from benchmarks.dataset import _power_law_edges
+
+    rng = random.Random(seed)
+    adjacency, _ = _power_law_edges(rng, n, avg_friends, 2.2)
+    ids = [str(ObjectId(i.to_bytes(12, "big"))) for i in range(n)]
+    return [{"_id": ids[i], "friends": [ids[j] for j in adjacency[i]]} for i in range(n)]
+
+
+async def friend_graph(users: int = 100000, avg_friends: float = 20, seed: int = 42, repeat: int = 200) -> dict:
+    from app.services.friend_graph import FriendGraph, np
+
+    docs = _power_law_users(users, avg_friends, seed)
+    graph = FriendGraph()
+    started = time.perf_counter()
+    await graph.load(_GraphDb(docs))
+    load = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    sample = [rng.choice(docs)["_id"] for _ in range(repeat)]
+    hub = max(docs, key=lambda doc: len(doc["friends"]))["_id"]
+    candidates = [doc["_id"] for doc in rng.sample(docs, min(200, len(docs)))]
+    return {
+        "users": users,
+        "numpy": np is not None,
+        "load_s": load,
+        "two_hop_us": _timeit(lambda: graph.two_hop(rng.choice(sample)), repeat) * 1e6,
+        "two_hop_hub_us": _timeit(lambda: graph.two_hop(hub), max(repeat // 10, 1)) * 1e6,
+        "mutual_counts_200_us": _timeit(lambda: graph.mutual_counts(rng.choice(sample), candidates), repeat) * 1e6,
+    }
+
+
+class _SuggestionsDb:
+    """What run_batch reads and writes: no pending requests, profiles by id, and the bulk write."""
+
+    def __init__(self, docs: List[dict], latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.profiles = {ObjectId(doc["_id"]): {"_id": ObjectId(doc["_id"]), "username": f"user{i:07d}"}
+                         for i, doc in enumerate(docs)}
+        self.friend_requests = self.users = self.cube_suggestions = self
+
+    def find(self, query, projection=None):
+        ids = query.get("_id", {}).get("$in")
+        return _Cursor([self.profiles[i] for i in ids] if ids is not None else [], self._sleep())
+
+    async def bulk_write(self, ops, ordered=True):
+        await self._sleep()
+
+    async def _sleep(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+
+async def suggestions_batch(users: int = 1_000_000, active: int = 100_000, avg_friends: float = 20,
+                            latency_ms: float = 2, seed: int = 42) -> dict:
+    """run_batch over `active` users of a `users`-user graph; each database call costs `latency_ms`."""
+    from app.services.friend_graph import FriendGraph, np
+    from app.services.suggestions import run_batch
+
+    started = time.perf_counter()
+    docs = _power_law_users(users, avg_friends, seed)
+    generate = time.perf_counter() - started
+    graph = FriendGraph()
+    started = time.perf_counter()
+    await graph.load(_GraphDb(docs))
+    load = time.perf_counter() - started
+
+    db = _SuggestionsDb(docs, latency_ms / 1000)
+    active_ids = [doc["_id"] for doc in random.Random(seed).sample(docs, min(active, len(docs)))]
+    del docs
+    batch = await run_batch(db, graph, active_ids)
+    return {
+        "users": users,
+        "active": batch["users"],
+        "numpy": np is not None,
+        "generate_s": generate,
+        "load_s": load,
+        "batch_s": batch["seconds"],
+        "users_per_s": batch["users"] / batch["seconds"] if batch["seconds"] else 0.0,
+        "db_calls": db.calls,
+    }
+
+
+class _SlowCollection:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def _call(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    insert_many = bulk_write = _call
+
+    def find(self, *args, **kwargs):
+        return _Cursor([], self._call())
+
+
+class _SlowDb(dict):
+    def __init__(self, latency: float):
+        super().__init__(chats=_SlowCollection(latency), conversations=_SlowCollection(latency))
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+async def chat_writer(windows_ms=(0, 1, 5, 10), messages: int = 5000, senders: int = 50, latency_ms: float = 2) -> dict:
+    """Throughput of the group-commit buffer with `senders` sockets producing concurrently."""
+    from app.chat.writer import ChatWriteBuffer
+    from app.crud.conversation import conversation_id
+    from app.db import database
+
+    results = {}
+    saved = database.db
+    try:
+        for window in windows_ms:
+            database.db = db = _SlowDb(latency_ms / 1000)
+            writer = ChatWriteBuffer(window_ms=window, max_batch=100, queue_size=10000, wait_for_ack=True)
+            await writer.start()
+
+            async def sender(i: int):
+                for m in range(messages // senders):
+                    await writer.submit({
+                        "_id": ObjectId(),
+                        "conversation_id": conversation_id(f"user{i}", f"user{i + 1}"),
+                        "sender_username": f"user{i}",
+                        "receiver_username": f"user{i + 1}",
+                        "message": "hi",
+                        "timestamp": datetime.utcnow(),
+                        "is_read": False,
+                    })
+
+            started = time.perf_counter()
+            await asyncio.gather(*(sender(i) for i in range(senders)))
+            elapsed = time.perf_counter() - started
+            await writer.stop()
+            results[f"{window}ms"] = {
+                "messages_per_s": writer.messages / elapsed,
+                "avg_batch": writer.stats()["avgBatchSize"],
+                "db_calls": db.chats.calls + db.conversations.calls,
+            }
+    finally:
+        database.db = saved
+    return results
+
+
+async def gather_queries(queries: int = 3, latency_ms: float = 5, repeat: int = 200) -> dict:
+    from app.core.concurrency import gather_queries as gather
+
+    async def query():
+        await asyncio.sleep(latency_ms / 1000)
+
+    async def sequential():
+        for _ in range(queries):
+            await query()
+
+    async def concurrent():
+        await gather(*(query() for _ in range(queries)))
+
+    results = {}
+    for name, handler in (("sequential", sequential), ("gather", concurrent)):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await handler()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        results[name] = {"p50_ms": percentile(latencies, 0.5) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+    return results
+
+
+async def run_all(graph_users: int, batch_graph_users: int, batch_users: int) -> dict:
+    results = {
+        "token_decode": token_decode(),
+        "feed_encode": feed_encode(),
+        "friend_graph": await friend_graph(users=graph_users),
+        "suggestions_batch": await suggestions_batch(users=batch_graph_users, active=batch_users),
+        "chat_writer": await chat_writer(),
+        "gather_queries": await gather_queries(),
+    }
+    for name, result in results.items():
+        print(f"{name}: {json.dumps(result)}")
+    return results
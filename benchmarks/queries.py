@@ -0,0 +1,124 @@
+"""Focused measurements against the loaded benchmark database.
+
+Handlers and query helpers are called directly, without HTTP, so each number
+isolates one code path:
+
+- deep_pages: today's feed at increasing depth, skip/limit vs keyset cursor,
+  with latency and the index keys and documents the posts query examined
+- profile_latency: the profile endpoint's p50/p99 with every Mongo command
+  delayed by a fixed latency, as a remote database would be
+
+The latency is injected by a CommandListener that sleeps in `started`. Motor
+runs each command on its executor threads, so the sleep delays that command
+without blocking the event loop, and concurrent commands overlap as they
+would over a real network.
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pymongo import monitoring
+
+from benchmarks.dataset import Dataset
+from benchmarks.micro import percentile
+
+
+class InjectedLatency(monitoring.CommandListener):
+    def __init__(self):
+        self.seconds = 0.0
+
+    def started(self, event):
+        if self.seconds:
+            time.sleep(self.seconds)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+injected_latency = InjectedLatency()
+monitoring.register(injected_latency)  # applies to clients created after this import
+
+
+def _summary(latencies: List[float]) -> dict:
+    latencies.sort()
+    return {"p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+async def deep_pages(db, depths=(1, 10, 50, 100, 200), limit: int = 10, repeat: int = 20) -> dict:
+    """Fetch page N of today's feed by skip and by cursor; `depths` beyond the feed are dropped."""
+    from app.core.cursor import decode_cursor, keyset_filter
+    from app.crud.post import fetch_feed
+
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=1)
+    query = {"createdAt": {"$gte": start, "$lt": end}}
+    order = [("createdAt", -1), ("_id", -1)]
+
+    # Walk the cursor chain once to find the cursor that opens each page
+    cursors, cursor, page = {1: None}, None, 1
+    while page < max(depths):
+        _, cursor = await fetch_feed(db, start, end, 0, limit, decode_cursor(cursor) if cursor else None)
+        if not cursor:
+            break
+        page += 1
+        cursors[page] = cursor
+
+    async def examined(find_query: dict, skip: int) -> dict:
+        explain = await db.posts.find(find_query).sort(order).skip(skip).limit(limit).explain()
+        stats = explain.get("executionStats", {})
+        return {"keys": stats.get("totalKeysExamined"), "docs": stats.get("totalDocsExamined")}
+
+    results = {}
+    for depth in (d for d in depths if d in cursors):
+        skip = (depth - 1) * limit
+        after = decode_cursor(cursors[depth]) if cursors[depth] else None
+        timings = {"skip": [], "cursor": []}
+        for _ in range(repeat):
+            for name, args in (("skip", (skip, None)), ("cursor", (0, after))):
+                started = time.perf_counter()
+                await fetch_feed(db, start, end, *args, limit)
+                timings[name].append(time.perf_counter() - started)
+        results[f"page{depth}"] = {
+            "skip": {**_summary(timings["skip"]), "examined": await examined(query, skip)},
+            "cursor": {**_summary(timings["cursor"]),
+                       "examined": await examined({**query, **keyset_filter(after)} if after else query, 0)},
+        }
+    return results
+
+
+async def profile_latency(db, data: Dataset, latencies_ms=(0, 1, 5, 10), repeat: int = 200, seed: int = 42) -> dict:
+    """Profile endpoint latency per injected per-command latency; the user cache is cleared per call."""
+    from app.api.api_v1.endpoints.profile import get_profile
+    from app.crud.user import user_cache
+
+    rng = random.Random(seed)
+    results = {}
+    try:
+        for latency in latencies_ms:
+            injected_latency.seconds = latency / 1000
+            timings = []
+            for _ in range(repeat):
+                user_cache.clear()  # measure the uncached path: every lookup reaches Mongo
+                user_id, viewer = rng.choice(data.user_ids), rng.choice(data.user_ids)
+                started = time.perf_counter()
+                await get_profile(user_id, viewer, db=db)
+                timings.append(time.perf_counter() - started)
+            results[f"{latency}ms"] = _summary(timings)
+    finally:
+        injected_latency.seconds = 0.0
+    return results
+
+
+async def run_all(db, data: Dataset) -> dict:
+    results = {
+        "deep_pages": await deep_pages(db),
+        "profile_latency": await profile_latency(db, data),
+    }
+    for name, result in results.items():
+        print(f"{name}: {json.dumps(result)}")
+    return results
@@ -0,0 +1,309 @@
+"""Workload mix driven against the real app.
+
+The app runs in-process under uvicorn on a local port, with its normal
+startup (indexes, chat writer, friend graph), and is driven over real HTTP
+and WebSocket connections. Each scenario runs `concurrency` workers for
+`duration` seconds; an operation is one request, or for chat_burst one
+message from send to delivery on the receiver's socket.
+
+Every Mongo command the process issues is counted by a globally registered
+CommandListener, so DB ops per operation include background work the
+scenario causes (e.g. chat group commits), not just the request itself.
+"""
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+import uvicorn
+import websockets
+from pymongo import monitoring
+
+from benchmarks.dataset import PASSWORD, Dataset
+from benchmarks.micro import percentile
+
+API = "/socialice"
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+command_counter = CommandCounter()
+monitoring.register(command_counter)  # applies to the client created at app startup
+
+
+@dataclass
+class Workload:
+    seed: int = 42
+    concurrency: int = 32
+    duration: float = 10  # seconds per scenario
+    logins: int = 200  # distinct authenticated viewers
+
+
+class Context:
+    """Per-worker state handed to each operation."""
+
+    def __init__(self, client: httpx.AsyncClient, data: Dataset, tokens: Dict[str, str], rng: random.Random, base_url: str):
+        self.client = client
+        self.data = data
+        self.tokens = tokens
+        self.rng = rng
+        self.base_url = base_url
+        self.state = {}
+
+    def viewer(self):
+        username = self.rng.choice(list(self.tokens))
+        return username, {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    def user_id(self) -> str:
+        return self.rng.choice(self.data.user_ids)
+
+
+def _check(response: httpx.Response) -> dict:
+    response.raise_for_status()
+    return response.json()
+
+
+async def feed_scroll(ctx: Context):
+    """Scroll today's feed by cursor, starting over after ten pages or at the end."""
+    if "headers" not in ctx.state or ctx.state.get("pages", 0) >= 10:
+        ctx.state.update(headers=ctx.viewer()[1], cursor=None, pages=0)
+    params = {"limit": 10}
+    if ctx.state["cursor"]:
+        params["cursor"] = ctx.state["cursor"]
+    body = _check(await ctx.client.get(f"{API}/posts/posts/paginated", params=params, headers=ctx.state["headers"]))
+    ctx.state["cursor"] = body["next_cursor"]
+    ctx.state["pages"] = ctx.state["pages"] + 1 if body["next_cursor"] else 10
+
+
+async def feed_poll(ctx: Context):
+    """Poll the first feed page with If-None-Match, as a client refreshing the feed does."""
+    if "headers" not in ctx.state:
+        ctx.state["headers"] = ctx.viewer()[1]
+    headers = dict(ctx.state["headers"])
+    if ctx.state.get("etag"):
+        headers["If-None-Match"] = ctx.state["etag"]
+    response = await ctx.client.get(f"{API}/posts/posts/paginated", params={"limit": 10}, headers=headers)
+    if response.status_code != 304:
+        response.raise_for_status()
+    ctx.state["etag"] = response.headers.get("etag")
+
+
+async def profile_view(ctx: Context):
+    _check(await ctx.client.get(f"{API}/profile/profile/{ctx.user_id()}", params={"current_user_id": ctx.user_id()}))
+
+
+async def inbox(ctx: Context):
+    username = ctx.rng.choice(ctx.state["chatters"])
+    _check(await ctx.client.get(f"{API}/chat/last-messages/{username}"))
+
+
+async def cube_search(ctx: Context):
+    username = ctx.rng.choice(ctx.data.usernames)
+    query = username[:ctx.rng.randint(6, len(username))]
+    _check(await ctx.client.get(f"{API}/cubes/search", params={"query": query, "user_id": ctx.user_id()}))
+
+
+async def hammer_storm(ctx: Context):
+    """Every worker hammers and un-hammers the same hot post."""
+    _check(await ctx.client.post(f"{API}/posts/hammer", json={
+        "post_id": ctx.data.post_ids[0],
+        "username": ctx.rng.choice(ctx.data.usernames),
+        "action": ctx.rng.choice(["add", "remove"]),
+    }))
+
+
+async def chat_burst(ctx: Context):
+    """Send over one socket and wait for delivery on the friend's socket."""
+    sender, receiver = ctx.state["pair"]
+    if "sender_socket" not in ctx.state:
+        url = ctx.base_url.replace("http", "ws", 1) + f"{API}/chat/ws/chat/"
+        ctx.state["receiver_socket"] = await websockets.connect(url + receiver)
+        ctx.state["sender_socket"] = await websockets.connect(url + sender)
+    await ctx.state["sender_socket"].send(json.dumps({
+        "type": "message", "sender": sender, "receiver": receiver, "content": "benchmark",
+    }))
+    while True:
+        event = json.loads(await asyncio.wait_for(ctx.state["receiver_socket"].recv(), 5))
+        if event.get("type") == "message" and event.get("sender_username") == sender:
+            return
+
+
+async def _close_sockets(ctx: Context):
+    for key in ("sender_socket", "receiver_socket"):
+        if key in ctx.state:
+            await ctx.state[key].close()
+
+
+SCENARIOS: Dict[str, Callable[[Context], Awaitable[None]]] = {
+    "feed_scroll": feed_scroll,
+    "feed_poll": feed_poll,
+    "profile_view": profile_view,
+    "inbox": inbox,
+    "cube_search": cube_search,
+    "hammer_storm": hammer_storm,
+    "chat_burst": chat_burst,
+}
+
+
+async def run_scenario(name: str, contexts: List[Context], duration: float) -> dict:
+    op = SCENARIOS[name]
+    latencies: List[float] = []
+    errors = Counter()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def worker(ctx: Context):
+        while loop.time() < deadline:
+            started = time.perf_counter()
+            try:
+                await op(ctx)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    commands_before = command_counter.commands.copy()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(ctx) for ctx in contexts))
+    finally:
+        for ctx in contexts:
+            await _close_sockets(ctx)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.1)  # let trailing group commits land in this scenario's counts
+    commands = command_counter.commands - commands_before
+
+    latencies.sort()
+    ops = len(latencies)
+    return {
+        "ops": ops,
+        "errors": sum(errors.values()),
+        "errorTypes": dict(errors),
+        "seconds": elapsed,
+        "throughput": ops / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "dbOps": sum(commands.values()),
+        "dbOpsPerOp": sum(commands.values()) / ops if ops else 0.0,
+        "dbOpsByCommand": dict(commands),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(data: Dataset, workload: Workload, scenarios: List[str]) -> dict:
+    from app.main import app
+    from app.db.database import get_db
+    from app.crud.feed_cache import feed_cache
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()  # startup failed; re-raise
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{port}"
+    rng = random.Random(workload.seed)
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=workload.concurrency, max_keepalive_connections=workload.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            tokens = {}
+            for username in rng.sample(data.usernames, min(workload.logins, len(data.usernames))):
+                body = _check(await client.post(f"{API}/auth/login", json={"username": username, "password": PASSWORD}))
+                tokens[username] = body["access_token"]
+
+            db = get_db()
+            chatters = await db.conversations.distinct("user") or data.usernames
+            by_id = dict(zip(data.user_ids, data.usernames))
+            pairs = [(by_id[a], by_id[b]) for a in data.user_ids for b in data.friends[a][:1] if b in by_id]
+            start_of_day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            if not await db.posts.find_one({"createdAt": {"$gte": start_of_day}}):
+                print("warning: no posts from today; reload the dataset so feed_scroll has something to read")
+
+            for name in scenarios:
+                contexts = []
+                worker_pairs = rng.sample(pairs, min(workload.concurrency, len(pairs)))
+                for i in range(workload.concurrency):
+                    ctx = Context(client, data, tokens, random.Random(f"{workload.seed}:{name}:{i}"), base_url)
+                    ctx.state["chatters"] = chatters
+                    if name == "chat_burst":
+                        if i >= len(worker_pairs):
+                            break
+                        ctx.state["pair"] = worker_pairs[i]
+                    contexts.append(ctx)
+                results[name] = await run_scenario(name, contexts, workload.duration)
+                r = results[name]
+                print(f"{name:14} {r['throughput']:9.1f} ops/s  p50 {r['p50_ms']:7.2f}ms  p95 {r['p95_ms']:7.2f}ms  "
+                      f"p99 {r['p99_ms']:7.2f}ms  db/op {r['dbOpsPerOp']:5.1f}  errors {r['errors']}")
+    finally:
+        server.should_exit = True
+        await serving
+
+    return {
+        "commit": git_commit(),
+        "startedAt": datetime.now(timezone.utc).isoformat(),
+        "dataset": data.summary(),
+        "workload": asdict(workload),
+        "scenarios": results,
+        "feedCache": feed_cache.stats(),
+    }
+
+
+# Metric -> True when a higher value is better
+COMPARED = {"throughput": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "dbOpsPerOp": False}
+
+
+def compare(base: dict, new: dict, tolerance: float) -> List[str]:
+    """Print both runs side by side; returns the regressions beyond `tolerance` (a fraction)."""
+    regressions = []
+    print(f"base {base.get('commit', '?')[:10]}  new {new.get('commit', '?')[:10]}")
+    for name, after in new["scenarios"].items():
+        before = base["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, value = before[metric], after[metric]
+            change = (value - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"{name:14} {metric:11} {old:10.2f} -> {value:10.2f}  {change:+7.1%}  {flag}")
+            if flag:
+                regressions.append(f"{name}.{metric}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{name}.errors")
+    return regressions
@@ -0,0 +1,89 @@
+"""Shared fixtures.
+
+Tests that need MongoDB run against TEST_MONGO_URI (default
+mongodb://localhost:27017), each in a fresh database that is dropped
+afterwards, and are skipped when no server answers. Transaction tests also
+need a replica set and skip themselves otherwise.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+# Settings are read at import time; give the app something to start with
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("DB_NAME", "socialice_test")
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app.db.indexes import ensure_indexes
+
+TEST_MONGO_URI = os.environ.get("TEST_MONGO_URI", "mongodb://localhost:27017")
+
+# Driver housekeeping, not queries issued by the code under test
+_HOUSEKEEPING = {"getMore", "endSessions", "killCursors", "hello", "isMaster", "ping"}
+
+
+class CommandLog(monitoring.CommandListener):
+    """Names of the commands a client started, in order."""
+
+    def __init__(self):
+        self.names = []
+
+    def started(self, event):
+        self.names.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def clear(self):
+        self.names.clear()
+
+    def queries(self):
+        return [name for name in self.names if name not in _HOUSEKEEPING]
+
+
+_unreachable = False  # remembered so later tests skip without waiting on the timeout again
+
+
+class Mongo:
+    def __init__(self):
+        self.commands = CommandLog()
+        self.client = None
+
+    def run(self, test):
+        """Run `await test(db)` on a fresh, indexed database; returns its result."""
+        if _unreachable:
+            pytest.skip(f"no MongoDB at {TEST_MONGO_URI}")
+
+        async def main():
+            global _unreachable
+            self.client = AsyncIOMotorClient(TEST_MONGO_URI, serverSelectionTimeoutMS=2000, event_listeners=[self.commands])
+            try:
+                await self.client.admin.command("ping")
+            except ServerSelectionTimeoutError:
+                self.client.close()
+                _unreachable = True
+                pytest.skip(f"no MongoDB at {TEST_MONGO_URI}")
+            db = self.client[f"socialice_test_{uuid.uuid4().hex[:12]}"]
+            try:
+                await ensure_indexes(db)
+                self.commands.clear()
+                return await test(db)
+            finally:
+                await self.client.drop_database(db.name)
+                self.client.close()
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def mongo():
+    return Mongo()
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.api.api_v1.endpoints import chat as chat_endpoint
+from app.chat.writer import ChatWriteBuffer
+from app.crud.conversation import conversation_id, mark_read_up_to
+from app.db import database
+
+
+def _message(sender, receiver, timestamp):
+    return {
+        "_id": ObjectId(),
+        "conversation_id": conversation_id(sender, receiver),
+        "sender_username": sender,
+        "receiver_username": receiver,
+        "message": "hi",
+        "timestamp": timestamp,
+        "is_read": False,
+    }
+
+
+async def _run_with_writer(db, monkeypatch, test):
+    writer = ChatWriteBuffer(window_ms=200, max_batch=100, queue_size=100, wait_for_ack=False)
+    monkeypatch.setattr(chat_endpoint, "chat_writer", writer)
+    saved, database.db = database.db, db
+    try:
+        await writer.start()
+        result = await test(writer)
+        await writer.stop()
+        return result
+    finally:
+        database.db = saved
+
+
+async def _state(db, message):
+    stored = await db.chats.find_one({"_id": message["_id"]})
+    side = await db.conversations.find_one({"user": "b", "peer": "a"})
+    return stored["is_read"], side["unreadCount"]
+
+
+def test_receipt_inside_the_commit_window_marks_the_message_read(mongo, monkeypatch):
+    async def test(db):
+        async def receive(writer):
+            message = _message("a", "b", datetime.utcnow())
+            await writer.submit(message)
+            assert writer.pending(message["_id"])  # still buffered when the receipt arrives
+            read = await chat_endpoint.apply_read_receipt(db, "b", "a", message["timestamp"])
+            return message, read
+
+        message, read = await _run_with_writer(db, monkeypatch, receive)
+        return read, await _state(db, message)
+
+    read, (is_read, unread) = mongo.run(test)
+    assert read == 1
+    assert (is_read, unread) == (True, 0)
+
+
+def test_message_written_after_the_watermark_is_stored_read(mongo, monkeypatch):
+    async def test(db):
+        async def receive(writer):
+            message = _message("a", "b", datetime.utcnow())
+            await writer.submit(message)
+            # As if another worker handled the receipt: the watermark moves while the message is buffered
+            await mark_read_up_to(db, "b", "a", message["timestamp"] + timedelta(seconds=1))
+            return message
+
+        message = await _run_with_writer(db, monkeypatch, receive)
+        return await _state(db, message)
+
+    assert mongo.run(test) == (True, 0)
@@ -0,0 +1,54 @@
+import asyncio
+
+from app.api.api_v1.endpoints.chat import ConnectionManager
+from app.chat.broker import InMemoryBroker
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+async def _managers():
+    broker = InMemoryBroker()
+    first, second = ConnectionManager(broker), ConnectionManager(broker)
+    await first.start()
+    await second.start()
+    return broker, first, second
+
+
+def test_message_reaches_user_on_other_manager():
+    async def scenario():
+        broker, first, second = await _managers()
+        bob = FakeSocket()
+        await second.connect("bob", bob)
+
+        await first.send_personal_message({"message": "hi"}, "bob")
+        assert bob.sent == [{"message": "hi"}]
+        assert await broker.get_presence("bob") == second.worker_id
+
+    asyncio.run(scenario())
+
+
+def test_stale_disconnect_keeps_newer_connection():
+    async def scenario():
+        broker, first, second = await _managers()
+        old, new = FakeSocket(), FakeSocket()
+        await first.connect("bob", old)
+        await second.connect("bob", new)  # bob reconnects on the other worker
+
+        await first.disconnect("bob", old)
+        await broker.clear_presence("bob", first.worker_id)
+        assert await broker.get_presence("bob") == second.worker_id
+
+        await first.send_personal_message({"message": "still here"}, "bob")
+        assert new.sent == [{"message": "still here"}]
+        assert old.sent == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.chat import writer as writer_module
+from app.chat.writer import ChatWriteBuffer
+from app.db import database
+
+
+class FlakyChats:
+    """insert_many that rejects the listed ids once, then stores everything."""
+
+    def __init__(self, reject_once=(), fail_first_call=False):
+        self.reject_once = set(reject_once)
+        self.fail_first_call = fail_first_call
+        self.stored = {}
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail_first_call:
+            self.fail_first_call = False
+            raise AutoReconnect("connection reset")
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc["_id"] in self.stored:
+                errors.append({"index": i, "code": 11000, "errmsg": "duplicate key"})
+            elif doc["_id"] in self.reject_once:
+                self.reject_once.discard(doc["_id"])
+                errors.append({"index": i, "code": 91, "errmsg": "shutting down"})
+            else:
+                self.stored[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class NoWatermarks:
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+class Conversations:
+    def __init__(self):
+        self.recorded = []
+
+    def find(self, *args, **kwargs):
+        return NoWatermarks()
+
+    async def bulk_write(self, ops, ordered=True):
+        self.recorded.append(len(ops))
+
+
+class FakeDb(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def _message(i):
+    return {
+        "_id": ObjectId(),
+        "conversation_id": "a:b",
+        "sender_username": "a",
+        "receiver_username": "b",
+        "message": f"m{i}",
+        "timestamp": datetime.utcnow(),
+        "is_read": False,
+    }
+
+
+def _run(chats, docs, retries=3):
+    async def main():
+        conversations = Conversations()
+        saved, database.db = database.db, FakeDb(chats=chats, conversations=conversations)
+        saved_backoff, writer_module.RETRY_BACKOFF_SECONDS = writer_module.RETRY_BACKOFF_SECONDS, 0
+        try:
+            writer = ChatWriteBuffer(window_ms=5, max_batch=100, queue_size=100, wait_for_ack=False, retries=retries)
+            await writer.start()
+            for doc in docs:
+                await writer.submit(doc)
+            await writer.stop()
+            return writer, conversations
+        finally:
+            database.db = saved
+            writer_module.RETRY_BACKOFF_SECONDS = saved_backoff
+
+    return asyncio.run(main())
+
+
+def test_partial_failure_is_retried_and_recorded():
+    docs = [_message(i) for i in range(10)]
+    chats = FlakyChats(reject_once=[docs[3]["_id"], docs[7]["_id"]])
+    writer, conversations = _run(chats, docs)
+    assert set(chats.stored) == {doc["_id"] for doc in docs}
+    assert writer.stats()["messages"] == 10 and writer.stats()["lost"] == 0
+    assert sum(conversations.recorded) == 2 * 10  # two summary updates per message
+
+
+def test_unacknowledged_batch_is_retried_without_duplicates():
+    docs = [_message(i) for i in range(5)]
+    chats = FlakyChats(fail_first_call=True)
+    writer, _ = _run(chats, docs)
+    assert len(chats.stored) == 5
+    assert writer.stats()["lost"] == 0
+
+
+def test_inserted_part_of_a_failed_batch_is_still_recorded():
+    docs = [_message(i) for i in range(4)]
+    chats = FlakyChats(reject_once=[docs[0]["_id"]])
+    writer, conversations = _run(chats, docs, retries=0)
+    assert writer.stats()["lost"] == 1
+    assert sum(conversations.recorded) == 2 * 3
+
+
+def test_buffered_message_is_pending_until_flushed():
+    async def main():
+        saved, database.db = database.db, FakeDb(chats=FlakyChats(), conversations=Conversations())
+        try:
+            writer = ChatWriteBuffer(window_ms=200, max_batch=100, queue_size=100, wait_for_ack=False)
+            await writer.start()
+            doc = _message(0)
+            await writer.submit(doc)  # sits in the buffer for the commit window
+            before = writer.pending(doc["_id"])
+            await writer.stop()
+            return doc, before, writer.pending(doc["_id"])
+        finally:
+            database.db = saved
+
+    doc, before, after = asyncio.run(main())
+    assert before["timestamp"] == doc["timestamp"]
+    assert after is None
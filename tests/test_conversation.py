@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from app.crud.conversation import conversation_id
+from app.db.migrations import backfill_conversation_ids
+
+NAMES = [("a:b", "c"), ("a", "b:c"), ("c", "a:b"), ("1:a", "b"), ("é:", "ü"), ("bob", "alice")]
+
+
+def test_conversation_ids_do_not_collide():
+    assert conversation_id("a:b", "c") != conversation_id("a", "b:c")
+    assert conversation_id("alice", "bob") == conversation_id("bob", "alice")
+    pairs = {frozenset(pair) for pair in NAMES}
+    assert len({conversation_id(*pair) for pair in NAMES}) == len(pairs)
+
+
+def test_backfill_matches_conversation_id(mongo):
+    async def test(db):
+        await db.chats.insert_many([{
+            "sender_username": sender,
+            "receiver_username": receiver,
+            "conversation_id": ":".join(sorted((sender, receiver))),  # the earlier, colliding form
+            "message": "hi",
+            "timestamp": datetime.utcnow(),
+        } for sender, receiver in NAMES])
+        await backfill_conversation_ids(db)
+        return [(c["sender_username"], c["receiver_username"], c["conversation_id"]) async for c in db.chats.find()]
+
+    for sender, receiver, stored in mongo.run(test):
+        assert stored == conversation_id(sender, receiver)
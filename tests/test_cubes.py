@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints.cubes import respond_to_request, search_cubes, send_friend_request
+from app.schemas.cube import RespondFriendRequest, SendFriendRequest
+from app.crud.user import normalize_username
+from app.db import database
+from app.db.migrations import backfill_username_lower
+
+
+def _with_app_db(db, test):
+    async def run():
+        saved, database.db = database.db, db
+        try:
+            return await test()
+        finally:
+            database.db = saved
+    return run()
+
+
+async def _two_users(db):
+    a, b = ObjectId(), ObjectId()
+    await db.users.insert_many([
+        {"_id": a, "username": f"a{a}", "phone": 1, "friends": []},
+        {"_id": b, "username": f"b{b}", "phone": 2, "friends": []},
+    ])
+    await db.friend_requests.insert_one({"from": a, "to": b, "requestedAt": datetime.utcnow()})
+    return a, b
+
+
+async def _friendship(db, a, b):
+    users = {user["_id"]: user["friends"] async for user in db.users.find({"_id": {"$in": [a, b]}})}
+    stats = {row["_id"]: row["friendCount"] async for row in db.user_stats.find({"_id": {"$in": [a, b]}})}
+    return users[a], users[b], stats.get(a), stats.get(b), await db.friend_requests.count_documents({})
+
+
+def test_double_accept_adds_the_friendship_once(mongo):
+    async def test(db):
+        a, b = await _two_users(db)
+        payload = RespondFriendRequest(from_user_id=str(a), to_user_id=str(b), accepted=True)
+        outcomes = await _with_app_db(db, lambda: asyncio.gather(
+            *(respond_to_request(payload) for _ in range(10)), return_exceptions=True
+        ))
+        return a, b, outcomes, await _friendship(db, a, b)
+
+    a, b, outcomes, friendship = mongo.run(test)
+    assert sum(not isinstance(outcome, Exception) for outcome in outcomes) == 1
+    assert all(outcome.status_code == 404 for outcome in outcomes if isinstance(outcome, HTTPException))
+    assert friendship == ([str(b)], [str(a)], 1, 1, 0)
+
+
+def test_failed_auto_accept_puts_the_request_back(mongo, monkeypatch):
+    async def failing_accept(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    async def test(db):
+        a, b = await _two_users(db)
+        monkeypatch.setattr("app.crud.friends.accept_friendship", failing_accept)
+        payload = SendFriendRequest(from_user_id=str(b), to_user_id=str(a))  # b asks a, who already asked b
+        with pytest.raises(RuntimeError):
+            await _with_app_db(db, lambda: send_friend_request(payload))
+        return a, b, await db.friend_requests.find_one({}, {"_id": 0, "from": 1, "to": 1})
+
+    a, b, request = mongo.run(test)
+    assert request == {"from": a, "to": b}
+
+
+def test_search_matches_names_beyond_the_basic_multilingual_plane(mongo):
+    async def test(db):
+        viewer = ObjectId()
+        names = ["ice", "ice\U0001F9CA", "Ice.Cube", "icy", "ÉCLAIR"]
+        await db.users.insert_many([{"_id": viewer, "username": "viewer", "username_lower": "viewer", "phone": 1}] + [
+            {"username": name, "username_lower": normalize_username(name), "phone": 2 + i} for i, name in enumerate(names)
+        ])
+
+        async def search(query):
+            body = await search_cubes(query=query, user_id=str(viewer), skip=0, limit=50)
+            return sorted(r["username"] for r in body["results"])
+
+        return await _with_app_db(db, lambda: search("ice")), await _with_app_db(db, lambda: search("ice."))
+
+    ice, ice_dot = mongo.run(test)
+    assert ice == sorted(["ice", "ice\U0001F9CA", "Ice.Cube"])
+    assert ice_dot == ["Ice.Cube"]  # "." is literal, not a regex wildcard
+
+
+def test_backfill_normalizes_like_signup(mongo):
+    async def test(db):
+        await db.users.insert_many([
+            {"username": "ÉCLAIR", "phone": 1},
+            {"username": "ÉCLAIR2", "username_lower": "Éclair2", "phone": 2},  # left by a $toLower backfill
+        ])
+        await backfill_username_lower(db)
+        return {user["username"]: user["username_lower"] async for user in db.users.find()}
+
+    assert mongo.run(test) == {"ÉCLAIR": "éclair", "ÉCLAIR2": "éclair2"}
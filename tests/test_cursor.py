@@ -0,0 +1,27 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.core.cursor import decode_cursor, encode_cursor
+
+
+def _raw(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    timestamp, _id = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc), ObjectId()
+    assert decode_cursor(encode_cursor(timestamp, _id)) == (timestamp, _id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    _raw("123"),
+    _raw("123:not-an-id"),
+    _raw(f"{10 ** 30}:{ObjectId()}"),
+    _raw(f"-{10 ** 30}:{ObjectId()}"),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    assert decode_cursor(cursor) is None
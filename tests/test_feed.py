@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from app.core.cursor import decode_cursor
+from app.crud.post import fetch_feed
+
+
+async def _seed_feed(db, posts: int):
+    now = datetime.now(timezone.utc)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    users = [{"_id": ObjectId(), "username": f"user{i}", "phone": 9000000000 + i, "profilePic": ""} for i in range(20)]
+    await db.users.insert_many(users)
+
+    post_docs = [{
+        "_id": ObjectId(),
+        "userId": str(users[i % len(users)]["_id"]),
+        "mediaUrl": f"https://cdn.example.com/{i}.jpg",
+        "mediaType": "image",
+        "caption": f"post {i}",
+        "hammerCount": 1,
+        "createdAt": start + timedelta(seconds=i),
+    } for i in range(posts)]
+    await db.posts.insert_many(post_docs)
+    await db.comments.insert_many([{
+        "postId": post["_id"],
+        "userId": users[(i + 1) % len(users)]["_id"],
+        "text": "nice",
+        "createdAt": post["createdAt"],
+    } for i, post in enumerate(post_docs)])
+    await db.hammers.insert_many([{
+        "postId": post["_id"],
+        "username": "user0",
+        "userId": post["userId"],
+        "hammeredAt": post["createdAt"],
+    } for post in post_docs])
+    return start, start + timedelta(days=1)
+
+
+def test_feed_query_count_does_not_grow_with_page_size(mongo):
+    async def test(db):
+        start, end = await _seed_feed(db, posts=60)
+        counts = {}
+        for limit in (1, 10, 50):
+            mongo.commands.clear()
+            items, _ = await fetch_feed(db, start, end, 0, limit, viewer="user0")
+            assert len(items) == limit
+            assert all(item["hammers"]["hammeredByCurrentUser"] for item in items)
+            counts[limit] = len(mongo.commands.queries())
+        return counts
+
+    counts = mongo.run(test)
+    assert counts[1] == counts[10] == counts[50], counts
+
+
+def test_feed_cursor_pages_match_skip_pages(mongo):
+    async def test(db):
+        start, end = await _seed_feed(db, posts=25)
+        by_skip = []
+        for skip in range(0, 25, 10):
+            items, _ = await fetch_feed(db, start, end, skip, 10)
+            by_skip += [item["_id"] for item in items]
+
+        by_cursor, cursor = [], None
+        while True:
+            items, cursor = await fetch_feed(db, start, end, 0, 10, decode_cursor(cursor) if cursor else None)
+            by_cursor += [item["_id"] for item in items]
+            if not cursor:
+                return by_skip, by_cursor
+
+    by_skip, by_cursor = mongo.run(test)
+    assert by_cursor == by_skip
+    assert len(by_cursor) == 25
@@ -0,0 +1,77 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import friend_graph as friend_graph_module
+from app.services.friend_graph import FriendGraph
+
+
+def _graph(users=300, edges=3000, seed=7):
+    rng = random.Random(seed)
+    graph = FriendGraph()
+    ids = [f"u{i}" for i in range(users)]
+    for user_id in ids:
+        graph._node(user_id)
+    for _ in range(edges):
+        a, b = rng.sample(ids, 2)
+        graph.add_friendship(a, b)
+    return graph, ids
+
+
+def _both_paths(monkeypatch, compute):
+    with_numpy = compute()
+    monkeypatch.setattr(friend_graph_module, "np", None)
+    return with_numpy, compute()
+
+
+@pytest.mark.skipif(friend_graph_module.np is None, reason="numpy not installed")
+def test_numpy_mutual_counts_match_set_intersection(monkeypatch):
+    graph, ids = _graph()
+    candidates = ids[1:] + ["unknown"]
+    with_numpy, with_sets = _both_paths(monkeypatch, lambda: graph.mutual_counts(ids[0], candidates))
+    assert with_numpy == with_sets
+    assert any(with_sets)
+
+
+@pytest.mark.skipif(friend_graph_module.np is None, reason="numpy not installed")
+def test_friends_shared_between_candidates_are_not_mutual(monkeypatch):
+    graph, ids = _graph(users=5000, edges=0)
+    for user_id in ids[1::100]:  # 50 friends spread over a wide node range, so numpy sorts
+        graph.add_friendship("viewer", user_id)
+    candidates = [f"c{i}" for i in range(20)]
+    for candidate in candidates:
+        for friend in ("u2", "u3", "u101"):  # only u101 is also the viewer's friend
+            graph.add_friendship(candidate, friend)
+    with_numpy, with_sets = _both_paths(monkeypatch, lambda: graph.mutual_counts("viewer", candidates))
+    assert with_numpy == with_sets == [1] * len(candidates)
+
+
+@pytest.mark.skipif(friend_graph_module.np is None, reason="numpy not installed")
+def test_numpy_two_hop_matches_counter(monkeypatch):
+    graph, ids = _graph()
+    with_numpy, with_sets = _both_paths(monkeypatch, lambda: dict(graph.two_hop(ids[0], top=len(ids))))
+    assert with_numpy == with_sets
+
+
+class _Users:
+    def __init__(self, docs, graph):
+        self.docs = docs
+        self.graph = graph
+
+    def find(self, *args, **kwargs):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+        self.graph.add_friendship("a", "c")  # accepted on this worker while the reload runs
+
+
+def test_load_keeps_friendships_added_while_it_runs():
+    graph = FriendGraph()
+    db = SimpleNamespace(users=_Users([{"_id": "a", "friends": ["b"]}, {"_id": "b", "friends": ["a"]}], graph))
+    asyncio.run(graph.load(db))
+    assert graph.mutual_counts("b", ["c"]) == [1]
+    assert graph.friend_count("a") == 2
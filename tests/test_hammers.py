@@ -0,0 +1,36 @@
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app.crud.hammer import add_hammer, remove_hammer
+
+PARALLEL = 1000
+USERS = 500  # every user hammers twice, so half the adds are duplicates
+
+
+def test_parallel_hammers_keep_exact_counts(mongo):
+    async def test(db):
+        author = str(ObjectId())
+        post = {"_id": ObjectId(), "userId": author, "hammerCount": 0, "createdAt": datetime.now(timezone.utc)}
+        await db.posts.insert_one(post)
+        usernames = [f"user{i % USERS}" for i in range(PARALLEL)]
+
+        await asyncio.gather(*(add_hammer(db, post, username) for username in usernames))
+        added = (
+            (await db.posts.find_one({"_id": post["_id"]}))["hammerCount"],
+            await db.hammers.count_documents({"postId": post["_id"]}),
+            (await db.user_stats.find_one({"_id": ObjectId(author)}))["hammersReceived"],
+        )
+
+        await asyncio.gather(*(remove_hammer(db, post, username) for username in usernames))
+        removed = (
+            (await db.posts.find_one({"_id": post["_id"]}))["hammerCount"],
+            await db.hammers.count_documents({"postId": post["_id"]}),
+            (await db.user_stats.find_one({"_id": ObjectId(author)}))["hammersReceived"],
+        )
+        return added, removed
+
+    added, removed = mongo.run(test)
+    assert added == (USERS, USERS, USERS)
+    assert removed == (0, 0, 0)
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.core.cursor import keyset_filter
+from app.db.indexes import INDEXES, ensure_indexes, index_report
+from app.db.migrations import unique_friend_requests
+
+NOW = datetime.now(timezone.utc)
+DAY = NOW.replace(hour=0, minute=0, second=0, microsecond=0)
+A, B = ObjectId(), ObjectId()
+
+# (collection, filter, sort) for the queries the endpoints and jobs issue
+QUERIES = {
+    "feed": ("posts", {"createdAt": {"$gte": DAY, "$lt": DAY + timedelta(days=1)}}, [("createdAt", -1), ("_id", -1)]),
+    "feed_cursor": ("posts", {"createdAt": {"$gte": DAY, "$lt": DAY + timedelta(days=1)}, **keyset_filter((NOW, A))},
+                    [("createdAt", -1), ("_id", -1)]),
+    "profile_posts": ("posts", {"userId": str(A), "createdAt": {"$gte": DAY, "$lt": DAY + timedelta(days=1)}}, None),
+    "timeline_high_fanout_posts": ("posts", {"userId": {"$in": [str(A), str(B)]}}, [("createdAt", -1), ("_id", -1)]),
+    "feed_comments": ("comments", {"postId": {"$in": [A, B]}}, [("createdAt", -1)]),
+    "feed_hammered": ("hammers", {"postId": {"$in": [A, B]}, "username": "user0"}, None),
+    "user_by_username": ("users", {"username": "user0"}, None),
+    "user_by_phone": ("users", {"phone": 9000000000}, None),
+    "cube_search": ("users", {"username_lower": {"$regex": "^user"}}, [("username_lower", 1)]),
+    "high_fanout_friends": ("users", {"highFanout": True, "friends": str(A)}, None),
+    "dashboard_requests": ("friend_requests", {"to": A}, [("requestedAt", -1)]),
+    "profile_pending_request": ("friend_requests", {"$or": [{"from": A, "to": B}, {"from": B, "to": A}]}, None),
+    "suggestion_pending_requests": ("friend_requests", {"$or": [{"from": {"$in": [A]}}, {"to": {"$in": [A]}}]}, None),
+    "suggestion_active_posters": ("posts", {"createdAt": {"$gte": DAY - timedelta(days=7)}}, None),
+    "suggestion_active_chatters": ("chats", {"timestamp": {"$gte": DAY - timedelta(days=7)}}, None),
+    "chat_daily": ("chats", {"conversation_id": "a:b", "timestamp": {"$gte": DAY}}, [("timestamp", 1)]),
+    "chat_history": ("chats", {"conversation_id": "a:b"}, [("timestamp", -1), ("_id", -1)]),
+    "inbox": ("conversations", {"user": "user0"}, [("timestamp", -1)]),
+    "chat_watermarks": ("conversations", {"$or": [{"user": "user0", "peer": "user1"}], "readUpTo": {"$exists": True}}, None),
+    "otp": ("otp", {"phone": 9000000000}, [("createdAt", -1)]),
+    "timeline": ("timelines", {"ownerId": str(A)}, [("createdAt", -1), ("postId", -1)]),
+}
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_query_uses_an_index(mongo, name):
+    collection, query, sort = QUERIES[name]
+
+    async def test(db):
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return await cursor.explain()
+
+    explain = mongo.run(test)
+    stages = set(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert "COLLSCAN" not in stages, f"{name} scans {collection}: {stages}"
+
+
+def test_failed_index_does_not_block_the_others(mongo):
+    async def test(db):
+        await db.users.drop_indexes()
+        await db.users.insert_many([
+            {"username": "dup", "username_lower": "dup", "phone": 1},
+            {"username": "dup", "username_lower": "dup", "phone": 2},
+        ])
+        failed = await ensure_indexes(db)
+        return failed, set(await db.users.index_information())
+
+    failed, existing = mongo.run(test)
+    assert failed == ["users.username_unique"]
+    assert {index.document["name"] for index in INDEXES["users"]} - existing == {"username_unique"}
+
+
+def test_unique_friend_requests_replaces_the_old_index(mongo):
+    async def test(db):
+        await db.friend_requests.drop_indexes()
+        await db.friend_requests.create_index([("from", 1), ("to", 1)], name="from_to")
+        a, b = ObjectId(), ObjectId()
+        await db.friend_requests.insert_many([
+            {"from": a, "to": b, "requestedAt": NOW},
+            {"from": a, "to": b, "requestedAt": NOW + timedelta(seconds=1)},
+        ])
+        failed = await ensure_indexes(db)
+        await unique_friend_requests(db)
+        return failed, await index_report(db), [r["requestedAt"] async for r in db.friend_requests.find()]
+
+    failed, report, kept = mongo.run(test)
+    assert failed == ["friend_requests.from_to_unique"]
+    assert report == {}
+    assert len(kept) == 1
@@ -0,0 +1,46 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.db.slow_queries import _winning_plan_stages
+from app.main import app
+
+client = TestClient(app)  # no `with`, so startup (and the database) is skipped
+URL = "/socialice/internal/stats/user-cache"
+
+
+def test_internal_endpoints_are_off_without_a_token(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", None)
+    assert client.get(URL, headers={"X-Internal-Token": ""}).status_code == 404
+
+
+def test_internal_endpoints_require_the_token(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "s3cret")
+    assert client.get(URL).status_code == 403
+    assert client.get(URL, headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get(URL, headers={"X-Internal-Token": "s3cret"}).status_code == 200
+
+
+
+def test_readiness_needs_no_token_and_hides_the_error(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", None)
+    response = client.get("/socialice/internal/ready")  # no database connected here
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Database unavailable"}
+
+
+def test_slow_query_plan_ignores_rejected_plans():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+        "rejectedPlans": [{"stage": "COLLSCAN"}],
+    }}
+    aggregate = {"stages": [{"$cursor": explain}, {"$group": {}}]}
+    assert _winning_plan_stages(explain, set()) == _winning_plan_stages(aggregate, set()) == {"FETCH", "IXSCAN"}
+
+
+def test_metrics_label_routes_with_their_full_template(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "s3cret")
+    client.get(URL, headers={"X-Internal-Token": "s3cret"})
+    client.get("/socialice/profile/profile/not-an-id")  # 400 before any database access
+    metrics = client.get("/metrics").text
+    assert 'route="/socialice/internal/stats/user-cache"' in metrics
+    assert 'route="/socialice/profile/profile/{user_id}",status="400"' in metrics
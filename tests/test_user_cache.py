@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from app.crud.user import UserCache
+
+USER_ID = ObjectId()
+
+
+class SlowUsers:
+    """find_one that reads the current document, then waits before answering."""
+
+    def __init__(self):
+        self.doc = {"_id": USER_ID, "username": "ice", "profilePic": "old.jpg"}
+        self.queries = 0
+        self.release = None
+
+    async def find_one(self, query):
+        self.queries += 1
+        doc = dict(self.doc)
+        if self.release is not None:
+            await self.release.wait()
+        return doc
+
+
+def test_lookup_running_during_an_invalidation_is_not_cached():
+    async def main():
+        cache = UserCache(maxsize=100, ttl=60, negative_ttl=5)
+        users = SlowUsers()
+        db = SimpleNamespace(users=users)
+        users.release = asyncio.Event()
+
+        stale = asyncio.ensure_future(cache.get(db, "_id", USER_ID))
+        await asyncio.sleep(0)  # the lookup has read the old document
+        users.doc = {**users.doc, "profilePic": "new.jpg"}
+        cache.invalidate(user_id=USER_ID, username="ice")  # as update_profile_pic does after its write
+        users.release.set()
+        await stale
+
+        users.release = None
+        fresh = await cache.get(db, "_id", USER_ID)
+        return fresh, users.queries
+
+    fresh, queries = asyncio.run(main())
+    assert fresh["profilePic"] == "new.jpg"
+    assert queries == 2
+
+
+def test_concurrent_misses_share_one_lookup():
+    async def main():
+        cache = UserCache(maxsize=100, ttl=60, negative_ttl=5)
+        users = SlowUsers()
+        users.release = asyncio.Event()
+        db = SimpleNamespace(users=users)
+        lookups = [asyncio.ensure_future(cache.get(db, "username", "ice")) for _ in range(5)]
+        await asyncio.sleep(0)
+        users.release.set()
+        found = await asyncio.gather(*lookups)
+        return found, users.queries
+
+    found, queries = asyncio.run(main())
+    assert all(user["_id"] == USER_ID for user in found)
+    assert queries == 1